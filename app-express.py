@@ -1,57 +1,57 @@
-import chatlas
 import great_tables as gt
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 import polars as pl
 from plotly.subplots import make_subplots
+from prepare_data import COMPANY_SIZES, LEAD_STATUSES, PLATFORMS
 from shiny import reactive
 from shiny.express import input, render, ui
 from shinywidgets import render_plotly
 import querychat as qc
 
-plotly_modebar_remove = ["zoom", "pan", "lasso", "select", "autoscale"]
-
+# The data, the FAQ inputs, the querychat configuration and the cached filter
+# and aggregate steps live in dashboard_data, so they are built once per
+# process and shared by all sessions rather than rebuilt by each session's
+# run of this file
+from dashboard_data import (
+    aggregate_leads,
+    converted_leads,
+    industries,
+    leads_df,
+    month_label,
+    querychat_config,
+    score_bin_width,
+    score_p75,
+)
 
-def use_github_models(system_prompt: str) -> chatlas.Chat:
-    return chatlas.ChatGithub(
-        model="gpt-4.1",
-        system_prompt=system_prompt,
-    )
+plotly_modebar_remove = ["zoom", "pan", "lasso", "select", "autoscale"]
 
-def use_anthropic_models(system_prompt: str) -> chatlas.Chat:
-    return chatlas.ChatAnthropic(
-        model="claude-3-7-sonnet-latest",
-        system_prompt=system_prompt,
+# Styling shared by the dashboard charts, layered over the default template
+pio.templates["marketing"] = go.layout.Template(
+    layout=dict(
+        plot_bgcolor="white",
+        modebar=dict(remove=plotly_modebar_remove),
     )
-
-
-def load_data():
-    leads_df = pl.read_csv("salesforce_leads.csv")
-    platform_df = pl.read_csv("platform_performance.csv")
-    quality_df = pl.read_csv("lead_quality_metrics.csv")
-
-    # Convert date columns
-    leads_df = leads_df.with_columns([
-        pl.col("created_date").str.to_date("%Y-%m-%d"),
-        pl.col("conversion_date").str.to_date("%Y-%m-%d"),
-    ])
-
-    # Add company size categories
-    leads_df = leads_df.with_columns(
-        pl.when(pl.col("employees") < 50)
-        .then(pl.lit("Small (< 50)"))
-        .when(pl.col("employees") <= 250)
-        .then(pl.lit("Medium (50-250)"))
-        .when(pl.col("employees") <= 500)
-        .then(pl.lit("Large (251-500)"))
-        .otherwise(pl.lit("Enterprise (500+)"))
-        .alias("company_size")
+)
+dashboard_template = "plotly+marketing"
+
+
+def format_dollars(col: pl.Expr) -> pl.Expr:
+    # Vectorized f"${x:,.0f}": reverse the digits, comma every three, reverse
+    # back. The digits are those of the absolute value, with the sign put in
+    # front of the "$", so a negative amount reads "-$1,234"
+    amount = col.round(0).cast(pl.Int64)
+    sign = pl.when(amount < 0).then(pl.lit("-")).otherwise(pl.lit(""))
+    return sign + pl.lit("$") + (
+        amount.abs()
+        .cast(pl.Utf8)
+        .str.reverse()
+        .str.replace_all(r"(\d{3})", "$1,")
+        .str.strip_chars_end(",")
+        .str.reverse()
     )
 
-    return leads_df, platform_df, quality_df
-
-
-leads_df, platform_df, quality_df = load_data()
 
 ui.page_opts(
     title="Marketing Team",
@@ -59,61 +59,27 @@ ui.page_opts(
 
 
 @reactive.calc
-def filtered_data():
-    # Apply filters
-    filtered_leads = leads_df
-
-    # Date filter
+def filter_key():
+    # The sidebar filters as a hashable key for the cached steps below
     date_start, date_end = input.date_range()
-    filtered_leads = filtered_leads.filter(
-        (pl.col("created_date") >= pl.lit(date_start))
-        & (pl.col("created_date") <= pl.lit(date_end))
+    return (
+        date_start,
+        date_end,
+        tuple(sorted(input.platforms())),
+        tuple(sorted(input.company_sizes())),
+        tuple(sorted(input.industries())),
+        tuple(sorted(input.lead_status())),
     )
 
-    # Platform filter
-    if input.platforms():
-        filtered_leads = filtered_leads.filter(
-            pl.col("platform").is_in(input.platforms())
-        )
-
-    # Company size filter
-    if input.company_sizes():
-        filtered_leads = filtered_leads.filter(
-            pl.col("company_size").is_in(input.company_sizes())
-        )
 
-    # Industry filter
-    if input.industries():
-        filtered_leads = filtered_leads.filter(
-            pl.col("industry").is_in(input.industries())
-        )
-
-    # Status filter
-    if input.lead_status():
-        filtered_leads = filtered_leads.filter(
-            pl.col("status").is_in(input.lead_status())
-        )
-
-    return {
-        "leads": filtered_leads,
-        "platform": platform_df,
-        "quality": quality_df,
-    }
+@reactive.calc
+def dashboard_aggregates():
+    return aggregate_leads(filter_key())
 
 
 @reactive.calc
 def trend_data():
-    filtered_leads = filtered_data()["leads"]
-
-    # Group by month and platform
-    df = (
-        filtered_leads.with_columns(
-            pl.col("created_date").dt.strftime("%Y-%m").alias("month")
-        )
-        .group_by(["month", "platform"])
-        .agg(pl.len().alias("leads"))
-        .sort(["month", "platform"])
-    )
+    df = dashboard_aggregates()["trend"]
 
     if len(df) == 0:
         return ui.div("No data available")
@@ -124,15 +90,7 @@ def trend_data():
 
 @reactive.calc
 def platform_stats():
-    filtered_leads = filtered_data()["leads"]
-
-    # Platform performance metrics
-    platform_stats = filtered_leads.group_by("platform").agg([
-        pl.col("lead_score").mean().alias("avg_lead_score"),
-        (pl.col("status").eq("Converted").sum() / pl.len() * 100).alias(
-            "conversion_rate"
-        ),
-    ])
+    platform_stats = dashboard_aggregates()["platform"]
 
     if len(platform_stats) == 0:
         return ui.div("No data available")
@@ -143,27 +101,7 @@ def platform_stats():
 
 @reactive.calc
 def funnel_data():
-    filtered_leads = filtered_data()["leads"]
-
-    # Conversion funnel by platform
-    funnel_data = []
-    for platform in filtered_leads["platform"].unique().to_list():
-        platform_leads = filtered_leads.filter(pl.col("platform") == platform)
-        total = platform_leads.height
-        qualified = platform_leads.filter(
-            pl.col("status").is_in(["Qualified", "Opportunity", "Converted"])
-        ).height
-        converted = platform_leads.filter(
-            pl.col("status") == "Converted"
-        ).height
-
-        funnel_data.extend([
-            {"platform": platform, "stage": "Total Leads", "count": total},
-            {"platform": platform, "stage": "Qualified", "count": qualified},
-            {"platform": platform, "stage": "Converted", "count": converted},
-        ])
-
-    funnel_df = pl.DataFrame(funnel_data)
+    funnel_df = dashboard_aggregates()["funnel"]
 
     if len(funnel_df) == 0:
         return ui.div("No data available")
@@ -173,20 +111,7 @@ def funnel_data():
 
 @reactive.calc
 def industry_stats():
-    filtered_leads = filtered_data()["leads"]
-
-    # Industry performance
-    industry_stats = (
-        filtered_leads.group_by("industry")
-        .agg([
-            pl.len().alias("lead_count"),
-            pl.col("lead_score").mean().alias("avg_lead_score"),
-            (pl.col("status").eq("Converted").sum() / pl.len() * 100).alias(
-                "conversion_rate"
-            ),
-        ])
-        .filter(pl.col("lead_count") >= 2)
-    )
+    industry_stats = dashboard_aggregates()["industry"]
 
     if len(industry_stats) == 0:
         return ui.div("No data available")
@@ -196,14 +121,7 @@ def industry_stats():
 
 @reactive.calc
 def revenue_data():
-    filtered_leads = filtered_data()["leads"]
-
-    # Revenue by platform and company size
-    revenue_data = (
-        filtered_leads.filter(pl.col("status") == "Converted")
-        .group_by(["platform", "company_size"])
-        .agg(pl.col("opportunity_value").sum().alias("revenue"))
-    )
+    revenue_data = dashboard_aggregates()["revenue"]
 
     if len(revenue_data) == 0:
         return ui.div("No data available")
@@ -211,6 +129,190 @@ def revenue_data():
         return revenue_data
 
 
+@reactive.calc
+def lead_score_hist():
+    return dashboard_aggregates()["score_hist"]
+
+
+@reactive.calc
+def kpi_summary():
+    return dashboard_aggregates()["kpi"].row(0, named=True)
+
+
+# Figure skeletons: built once at import with all styling and one trace per
+# series. Each chart renders its skeleton once per session and a reactive
+# effect then only swaps the trace data when the filters change.
+def update_platform_traces(fig, df, x, y):
+    # Point each per-platform trace at its rows of `df`; platforms without
+    # data are hidden (`df` is a placeholder div when nothing matches)
+    if isinstance(df, pl.DataFrame):
+        parts = df.partition_by("platform", as_dict=True)
+    else:
+        parts = {}
+
+    for trace in fig.data:
+        part = parts.get((trace.name,))
+        trace.visible = part is not None
+        if part is not None:
+            trace.x = part[x].to_list()
+            trace.y = part[y].to_list()
+
+
+def make_leads_trend_fig():
+    fig = go.Figure([
+        go.Scatter(name=platform, mode="lines+markers", hovertemplate="Leads: %{y}")
+        for platform in PLATFORMS
+    ])
+
+    fig.update_layout(
+        title="Lead Generation Trends by Platform",
+        xaxis_title="Month",
+        legend_title_text="Platform",
+        hovermode="x unified",
+        template=dashboard_template,
+        yaxis=dict(
+            title="Number of Leads",
+            fixedrange=True,  # Prevent y-axis from auto-adjusting
+        ),
+    )
+
+    return fig
+
+
+def make_platform_performance_fig():
+    # Create a figure with secondary y-axis
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+
+    # Add bar chart for lead score
+    fig.add_trace(
+        go.Bar(
+            name="Average Lead Score",
+            opacity=0.8,
+            hovertemplate="<b>%{x}</b><br>Avg Lead Score: %{y:.1f}<extra></extra>",
+        ),
+        secondary_y=False,
+    )
+
+    # Add line and points for conversion rate
+    fig.add_trace(
+        go.Scatter(
+            mode="lines+markers",
+            name="Conversion Rate (%)",
+            hovertemplate="<b>%{x}</b><br>Conversion Rate: %{y:.1f}%<extra></extra>",
+        ),
+        secondary_y=True,
+    )
+
+    # Set axis titles and layout properties
+    fig.update_layout(
+        title={
+            "text": "Platform Performance: Lead Score vs Conversion Rate",
+        },
+        template=dashboard_template,
+        hoverlabel=dict(bgcolor="white", font_size=12),
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=0.95,
+            xanchor="center",
+            x=0.5,
+        ),
+    )
+
+    # Update axes: shared styling, then the per-axis titles
+    axis_style = dict(
+        title_font=dict(size=12, color="#64748b"),
+        tickfont=dict(size=10),
+        gridcolor="#f1f5f9",
+    )
+    fig.update_xaxes(title_text="Platform", **axis_style)
+    fig.update_yaxes(**axis_style)
+    fig.update_yaxes(title_text="Average Lead Score", secondary_y=False)
+    fig.update_yaxes(title_text="Conversion Rate (%)", secondary_y=True)
+
+    return fig
+
+
+def make_conversion_funnel_fig():
+    fig = go.Figure([
+        go.Bar(
+            name=platform,
+            hovertemplate="<b>%{x}</b><br>Platform: %{fullData.name}<br>Count: %{y}<extra></extra>",
+        )
+        for platform in PLATFORMS
+    ])
+
+    fig.update_layout(
+        title="Conversion Funnel by Platform",
+        barmode="group",
+        xaxis=dict(
+            title="Stage",
+            categoryorder="array",
+            categoryarray=["Total Leads", "Qualified", "Converted"],
+        ),
+        yaxis_title="Number of Leads",
+        legend_title_text="Platform",
+        template=dashboard_template,
+    )
+
+    return fig
+
+
+def make_revenue_analysis_fig():
+    fig = go.Figure([
+        go.Bar(
+            name=platform,
+            hovertemplate="<b>%{x}</b><br>Platform: %{fullData.name}<br>Revenue: $%{y:,.0f}<extra></extra>",
+        )
+        for platform in PLATFORMS
+    ])
+
+    fig.update_layout(
+        title="Revenue by Company Size and Platform",
+        barmode="group",  # Equivalent to position='dodge' in ggplot
+        xaxis=dict(
+            title="Company Size",
+            categoryorder="array",
+            categoryarray=COMPANY_SIZES,
+        ),
+        yaxis_title="Revenue ($)",
+        legend_title_text="Platform",
+        template=dashboard_template,
+    )
+
+    return fig
+
+
+def make_lead_score_fig():
+    fig = go.Figure([
+        go.Bar(
+            name=platform,
+            width=score_bin_width,
+            opacity=0.8,
+            hovertemplate="<b>Lead Score: %{x:.1f}</b><br>Platform: %{fullData.name}<br>Count: %{y}<extra></extra>",
+        )
+        for platform in PLATFORMS
+    ])
+
+    fig.update_layout(
+        title="Lead Score Distribution by Platform",
+        barmode="overlay",  # Equivalent to position='identity'
+        xaxis_title="Lead Score",
+        yaxis_title="Count",
+        legend_title_text="Platform",
+        template=dashboard_template,
+    )
+
+    return fig
+
+
+leads_trend_fig = make_leads_trend_fig()
+platform_performance_fig = make_platform_performance_fig()
+conversion_funnel_fig = make_conversion_funnel_fig()
+revenue_analysis_fig = make_revenue_analysis_fig()
+lead_score_fig = make_lead_score_fig()
+
+
 with ui.nav_panel("Dashboard"):
     ui.h1("Lead Quality Dashboard")
 
@@ -228,61 +330,28 @@ with ui.nav_panel("Dashboard"):
             ui.input_checkbox_group(
                 "platforms",
                 "Platforms",
-                choices=[
-                    "LinkedIn",
-                    "TikTok",
-                    "Events",
-                    "Google Ads",
-                    "Facebook",
-                    "YouTube",
-                    "Webinars",
-                    "Podcasts",
-                ],
-                selected=[
-                    "LinkedIn",
-                    "TikTok",
-                    "Events",
-                    "Google Ads",
-                    "Facebook",
-                    "YouTube",
-                    "Webinars",
-                    "Podcasts",
-                ],
+                choices=PLATFORMS,
+                selected=PLATFORMS,
             )
 
             ui.input_checkbox_group(
                 "company_sizes",
                 "Company Size",
-                choices=[
-                    "Small (< 50)",
-                    "Medium (50-250)",
-                    "Large (251-500)",
-                    "Enterprise (500+)",
-                ],
-                selected=[
-                    "Small (< 50)",
-                    "Medium (50-250)",
-                    "Large (251-500)",
-                    "Enterprise (500+)",
-                ],
+                choices=COMPANY_SIZES,
+                selected=COMPANY_SIZES,
             )
 
             ui.input_checkbox_group(
                 "lead_status",
                 "Lead Status",
-                choices=["Converted", "Qualified", "Opportunity", "Nurturing"],
-                selected=[
-                    "Converted",
-                    "Qualified",
-                    "Opportunity",
-                    "Nurturing",
-                ],
+                choices=LEAD_STATUSES,
+                selected=LEAD_STATUSES,
             )
 
             ui.input_selectize(
                 "industries",
                 "Industries",
-                choices=leads_df["industry"].unique().sort().to_list(),
+                choices=industries,
                 selected=[],
                 multiple=True,
             )
@@ -297,34 +366,21 @@ with ui.nav_panel("Dashboard"):
 
                 @render.ui
                 def kpi_total_leads():
-                    filtered_leads = filtered_data()["leads"]
-                    total_leads = filtered_leads.height
-                    return total_leads
+                    return kpi_summary()["total_leads"]
 
             with ui.value_box():
                 "Conversion Rate"
 
                 @render.ui
                 def kpi_conversion_rate():
-                    filtered_leads = filtered_data()["leads"]
-                    conversion_rate = (
-                        filtered_leads.filter(
-                            pl.col("status") == "Converted"
-                        ).height
-                        / filtered_leads.height
-                    ) * 100
-                    return conversion_rate
+                    return kpi_summary()["conversion_rate"]
 
             with ui.value_box():
                 "Ave Deal Size"
 
                 @render.ui
                 def kpi_avg_deal_size():
-                    filtered_leads = filtered_data()["leads"]
-                    converted_leads = filtered_leads.filter(
-                        pl.col("status") == "Converted"
-                    )
-                    avg_deal = converted_leads["opportunity_value"].mean()
+                    avg_deal = kpi_summary()["avg_deal"]
                     return f"${avg_deal:,.0f}"
 
             with ui.value_box():
@@ -332,189 +388,76 @@ with ui.nav_panel("Dashboard"):
 
                 @render.ui
                 def kpi_total_revenue():
-                    filtered_leads = filtered_data()["leads"]
-                    converted_leads = filtered_leads.filter(
-                        pl.col("status") == "Converted"
-                    )
-                    total_revenue = converted_leads["opportunity_value"].sum()
+                    total_revenue = kpi_summary()["total_revenue"]
                     return f"${total_revenue:,.0f}"
 
         with ui.layout_column_wrap():
 
             @render_plotly
             def leads_trend_chart():
-                fig = px.line(
-                    trend_data(),
-                    x="month",
-                    y="leads",
-                    color="platform",
-                    markers=True,
-                    title="Lead Generation Trends by Platform",
-                    labels={
-                        "month": "Month",
-                        "leads": "Number of Leads",
-                        "platform": "Platform",
-                    },
-                )
+                return leads_trend_fig
 
-                # Calculate global y-axis range to maintain consistency
-                y_max = trend_data()["leads"].max() * 1.1  # Add 10% padding
-
-                fig.update_layout(
-                    hovermode="x unified",
-                    plot_bgcolor="white",
-                    modebar_remove=plotly_modebar_remove,
-                    yaxis=dict(
-                        range=[0, y_max],  # Set fixed y-axis range
-                        fixedrange=True,  # Prevent y-axis from auto-adjusting
-                    ),
-                )
+            @reactive.effect
+            def update_leads_trend_chart():
+                trend_df = trend_data()
+                fig = leads_trend_chart.widget
 
-                fig.update_traces(
-                    hovertemplate="Leads: %{y}",
-                    customdata=trend_data()["platform"],
-                )
+                with fig.batch_update():
+                    update_platform_traces(fig, trend_df, "month", "leads")
 
-                return fig
+                    # Fix the y-axis range to maintain consistency
+                    if isinstance(trend_df, pl.DataFrame):
+                        y_max = trend_df["leads"].max() * 1.1  # Add 10% padding
+                        fig.layout.yaxis.range = [0, y_max]
 
             @render_plotly
             def platform_performance_chart():
-                # Create a figure with secondary y-axis
-                fig = make_subplots(specs=[[{"secondary_y": True}]])
-
-                # Add bar chart for lead score
-                fig.add_trace(
-                    go.Bar(
-                        x=platform_stats()["platform"],
-                        y=platform_stats()["avg_lead_score"],
-                        name="Average Lead Score",
-                        opacity=0.8,
-                        hovertemplate="<b>%{x}</b><br>Avg Lead Score: %{y:.1f}<extra></extra>",
-                    ),
-                    secondary_y=False,
-                )
+                return platform_performance_fig
 
-                # Add line and points for conversion rate
-                fig.add_trace(
-                    go.Scatter(
-                        x=platform_stats()["platform"],
-                        y=platform_stats()["conversion_rate"],
-                        mode="lines+markers",
-                        name="Conversion Rate (%)",
-                        hovertemplate="<b>%{x}</b><br>Conversion Rate: %{y:.1f}%<extra></extra>",
-                    ),
-                    secondary_y=True,
-                )
+            @reactive.effect
+            def update_platform_performance_chart():
+                stats = platform_stats()
+                fig = platform_performance_chart.widget
 
-                # Set axis titles and layout properties
-                fig.update_layout(
-                    title={
-                        "text": "Platform Performance: Lead Score vs Conversion Rate",
-                    },
-                    plot_bgcolor="white",
-                    hoverlabel=dict(bgcolor="white", font_size=12),
-                    modebar_remove=plotly_modebar_remove,
-                    legend=dict(
-                        orientation="h",
-                        yanchor="bottom",
-                        y=0.95,
-                        xanchor="center",
-                        x=0.5,
-                    ),
-                )
+                # Fall back to the empty aggregate when no leads match
+                if not isinstance(stats, pl.DataFrame):
+                    stats = dashboard_aggregates()["platform"]
+                stats = stats.sort("platform")
 
-                # Update axes
-                fig.update_xaxes(
-                    title_text="Platform",
-                    title_font=dict(size=12, color="#64748b"),
-                    tickfont=dict(size=10),
-                    gridcolor="#f1f5f9",
-                )
+                with fig.batch_update():
+                    bar, line = fig.data
+                    bar.x = line.x = stats["platform"].to_list()
+                    bar.y = stats["avg_lead_score"].to_list()
+                    line.y = stats["conversion_rate"].to_list()
 
-                fig.update_yaxes(
-                    title_text="Average Lead Score",
-                    title_font=dict(size=12, color="#64748b"),
-                    tickfont=dict(size=10),
-                    gridcolor="#f1f5f9",
-                    secondary_y=False,
-                )
-
-                fig.update_yaxes(
-                    title_text="Conversion Rate (%)",
-                    title_font=dict(size=12, color="#64748b"),
-                    tickfont=dict(size=10),
-                    gridcolor="#f1f5f9",
-                    secondary_y=True,
-                )
-
-                # Fix y-axis ranges to prevent jumping when interacting
-                y1_max = platform_stats()["avg_lead_score"].max() * 1.1
-                y2_max = platform_stats()["conversion_rate"].max() * 1.1
-
-                fig.update_yaxes(range=[0, y1_max], secondary_y=False)
-                fig.update_yaxes(range=[0, y2_max], secondary_y=True)
-
-                return fig
+                    # Fix y-axis ranges to prevent jumping when interacting
+                    if len(stats) > 0:
+                        fig.layout.yaxis.range = [0, stats["avg_lead_score"].max() * 1.1]
+                        fig.layout.yaxis2.range = [0, stats["conversion_rate"].max() * 1.1]
 
         with ui.layout_column_wrap():
 
             @render_plotly
             def conversion_funnel_chart():
-                fig = px.bar(
-                    funnel_data(),
-                    x="stage",
-                    y="count",
-                    color="platform",
-                    barmode="group",
-                    title="Conversion Funnel by Platform",
-                    labels={
-                        "stage": "Stage",
-                        "count": "Number of Leads",
-                        "platform": "Platform",
-                    },
-                )
+                return conversion_funnel_fig
 
-                fig.update_layout(
-                    plot_bgcolor="white",
-                    modebar_remove=plotly_modebar_remove,
-                )
+            @reactive.effect
+            def update_conversion_funnel_chart():
+                fig = conversion_funnel_chart.widget
 
-                # Add hover template for better information display
-                fig.update_traces(
-                    hovertemplate="<b>%{x}</b><br>Platform: %{fullData.name}<br>Count: %{y}<extra></extra>"
-                )
-
-                return fig
+                with fig.batch_update():
+                    update_platform_traces(fig, funnel_data(), "stage", "count")
 
             @render_plotly
             def lead_score_distribution():
-                fig = px.histogram(
-                    filtered_data()["leads"],
-                    x="lead_score",
-                    color="platform",
-                    nbins=20,  # Equivalent to bins=20 in ggplot
-                    opacity=0.8,  # Equivalent to alpha=0.8
-                    barmode="overlay",  # Equivalent to position='identity'
-                    title="Lead Score Distribution by Platform",
-                    labels={
-                        "lead_score": "Lead Score",
-                        "count": "Count",
-                        "platform": "Platform",
-                    },
-                )
-
-                # Update layout to match the ggplot styling
-                fig.update_layout(
-                    modebar_remove=plotly_modebar_remove,
-                    plot_bgcolor="white",
-                )
+                return lead_score_fig
 
-                # Add hover template for better information display
-                fig.update_traces(
-                    hovertemplate="<b>Lead Score: %{x}</b><br>Platform: %{fullData.name}<br>Count: %{y}<extra></extra>"
-                )
+            @reactive.effect
+            def update_lead_score_distribution():
+                fig = lead_score_distribution.widget
 
-                return fig
+                with fig.batch_update():
+                    update_platform_traces(fig, lead_score_hist(), "lead_score", "count")
 
         @render_plotly
         def industry_performance_chart():
@@ -533,10 +476,7 @@ with ui.nav_panel("Dashboard"):
             )
 
             # Update layout to match the ggplot styling
-            fig.update_layout(
-                modebar_remove=plotly_modebar_remove,
-                plot_bgcolor="white",
-            )
+            fig.update_layout(template=dashboard_template)
 
             # Improve hover information
             fig.update_traces(
@@ -552,51 +492,39 @@ with ui.nav_panel("Dashboard"):
 
         @render_plotly
         def revenue_analysis_chart():
-            fig = px.bar(
-                revenue_data(),
-                x="company_size",
-                y="revenue",
-                color="platform",
-                barmode="group",  # Equivalent to position='dodge' in ggplot
-                title="Revenue by Company Size and Platform",
-                labels={
-                    "company_size": "Company Size",
-                    "revenue": "Revenue ($)",
-                    "platform": "Platform",
-                },
-            )
+            return revenue_analysis_fig
 
-            # Update layout to match the ggplot styling
-            fig.update_layout(
-                modebar_remove=plotly_modebar_remove,
-                plot_bgcolor="white",
-                xaxis=dict(),
-                yaxis=dict(),
-            )
+        @reactive.effect
+        def update_revenue_analysis_chart():
+            fig = revenue_analysis_chart.widget
 
-            # Add hover template for better information display
-            fig.update_traces(
-                hovertemplate="<b>%{x}</b><br>Platform: %{fullData.name}<br>Revenue: $%{y:,.0f}<extra></extra>"
-            )
-
-            return fig
+            with fig.batch_update():
+                update_platform_traces(fig, revenue_data(), "company_size", "revenue")
 
 
 with ui.nav_panel("FAQ"):
 
+    @reactive.calc
+    def platform_faq_stats():
+        # One grouping pass feeds both platform quality views
+        return leads_df.group_by("platform").agg([
+            pl.len().alias("total"),
+            pl.col("is_converted").sum().alias("converted"),
+            pl.col("lead_score").mean().alias("avg_lead_score"),
+        ])
+
     @reactive.calc
     def by_conversion_rate():
         conversion_rate = (
-            leads_df.group_by("platform")
-            .agg([
-                pl.len().alias("total"),
-                (pl.col("status") == "Converted").sum().alias("converted"),
-            ])
-            .with_columns(
+            platform_faq_stats()
+            .select([
+                "platform",
+                "total",
+                "converted",
                 (pl.col("converted").cast(pl.Float64) / pl.col("total")).alias(
                     "conversion_rate"
-                )
-            )
+                ),
+            ])
             .sort("conversion_rate", descending=True)
         )
         return conversion_rate
@@ -604,10 +532,11 @@ with ui.nav_panel("FAQ"):
     @reactive.calc
     def by_average_lead_score():
         lead_score = (
-            leads_df.group_by("platform")
-            .agg([
-                pl.col("lead_score").mean().alias("avg_lead_score"),
-                pl.len().alias("total_leads"),
+            platform_faq_stats()
+            .select([
+                "platform",
+                "avg_lead_score",
+                pl.col("total").alias("total_leads"),
             ])
             .sort("avg_lead_score", descending=True)
         )
@@ -630,7 +559,7 @@ with ui.nav_panel("FAQ"):
 
                     @render_plotly
                     def plot_highest_conversion_rate():
-                        df_plot = by_conversion_rate().to_pandas()
+                        df_plot = by_conversion_rate()
 
                         # Create the bar chart
                         fig = px.bar(
@@ -659,33 +588,6 @@ with ui.nav_panel("FAQ"):
                             height=500,
                         )
 
-                        # Alternative with more customization using graph_objects
-                        fig_custom = go.Figure(
-                            data=[
-                                go.Bar(
-                                    x=df_plot["platform"],
-                                    y=df_plot["conversion_rate"],
-                                    text=[
-                                        f"{rate:.1%}"
-                                        for rate in df_plot["conversion_rate"]
-                                    ],
-                                    textposition="outside",
-                                    marker_color="lightblue",
-                                    marker_line_color="darkblue",
-                                    marker_line_width=1.5,
-                                )
-                            ]
-                        )
-
-                        fig_custom.update_layout(
-                            title="Platform Conversion Rates - Highest Quality Leads",
-                            xaxis_title="Platform",
-                            yaxis_title="Conversion Rate",
-                            yaxis_tickformat=".1%",
-                            height=500,
-                            template="plotly_white",
-                        )
-
                         return fig
 
             "Define quality leads by average lead score"
@@ -750,18 +652,19 @@ with ui.nav_panel("FAQ"):
                     @render.data_frame
                     def show_revenue_potential():
                         formatted_results = revenue_potential().with_columns(
-                            pl.col("total_revenue_potential").map_elements(
-                                lambda x: f"${x:,.0f}",
-                                return_dtype=pl.Utf8
-                            ).alias("formatted_revenue")
+                            format_dollars(pl.col("total_revenue_potential")).alias(
+                                "formatted_revenue"
+                            )
                         )
                         return formatted_results
 
                 with ui.card():
                     @render_plotly
                     def plot_revenue_potential():
+                        revenue_df = revenue_potential()
+
                         fig = px.bar(
-                            revenue_potential(),
+                            revenue_df,
                             x='total_revenue_potential',
                             y='company_size',
                             orientation='h',
@@ -773,7 +676,7 @@ with ui.nav_panel("FAQ"):
                             text='total_revenue_potential',
                             color='total_revenue_potential',
                             color_continuous_scale='Blues',
-                            category_orders={'company_size': revenue_potential()['company_size']}
+                            category_orders={'company_size': revenue_df['company_size']}
                         )
 
                         fig.update_traces(
@@ -801,56 +704,33 @@ with ui.nav_panel("FAQ"):
             @render.data_frame
             def best_lead_characteristics():
 
-                # Step 1: Filter converted leads and find 75th percentile threshold
-                converted_leads = leads_df.filter(pl.col("status") == "Converted")
-
-                score_p75 = converted_leads.select(
-                    pl.col("lead_score").quantile(0.75).alias("score_p75")
-                ).item()
-
-                # Step 2: Filter high score converted leads
+                # Step 1: Filter high score converted leads, using the module
+                # level 75th percentile threshold
                 high_score_converted = converted_leads.filter(
                     pl.col("lead_score") >= score_p75
                 )
 
-                # Step 3: Get most common values for categorical columns
-                top_platform = (
-                    high_score_converted
-                    .group_by("platform")
-                    .agg(pl.len().alias("count"))
-                    .sort("count", descending=True)
-                    .limit(1)
-                    .select("platform")
-                    .item()
-                )
-
-                top_industry = (
-                    high_score_converted
-                    .group_by("industry")
-                    .agg(pl.len().alias("count"))
-                    .sort("count", descending=True)
-                    .limit(1)
-                    .select("industry")
-                    .item()
-                )
-
-                top_company_size = (
-                    high_score_converted
-                    .group_by("company_size")
-                    .agg(pl.len().alias("count"))
-                    .sort("count", descending=True)
-                    .limit(1)
-                    .select("company_size")
-                    .item()
-                )
-
-                # Step 4: Calculate individual metrics
-                lead_count = high_score_converted.height
-                avg_opportunity_value = high_score_converted.select(pl.col("opportunity_value").mean()).item()
-                avg_employees = high_score_converted.select(pl.col("employees").mean()).item()
-                avg_annual_revenue = high_score_converted.select(pl.col("annual_revenue").mean()).item()
-
-                # Step 5: Create long format report table
+                # Step 2: Most common categories and averages in one pass
+                summary = high_score_converted.select([
+                    pl.len().alias("lead_count"),
+                    pl.col("platform").mode().sort().first().alias("top_platform"),
+                    pl.col("industry").mode().sort().first().alias("top_industry"),
+                    pl.col("company_size").mode().sort().first().alias("top_company_size"),
+                    pl.col("opportunity_value").mean().alias("avg_opportunity_value"),
+                    pl.col("employees").mean().alias("avg_employees"),
+                    pl.col("annual_revenue").mean().alias("avg_annual_revenue"),
+                ]).row(0, named=True)
+
+                # Step 3: Unpack individual metrics
+                lead_count = summary["lead_count"]
+                top_platform = summary["top_platform"]
+                top_industry = summary["top_industry"]
+                top_company_size = summary["top_company_size"]
+                avg_opportunity_value = summary["avg_opportunity_value"]
+                avg_employees = summary["avg_employees"]
+                avg_annual_revenue = summary["avg_annual_revenue"]
+
+                # Step 4: Create long format report table
                 report_data = [
                     ("Lead Score Threshold (75th Percentile)", f"{score_p75:.1f}"),
                     ("Total High Score Converted Leads", f"{lead_count:,}"),
@@ -876,28 +756,19 @@ with ui.nav_panel("FAQ"):
         ):
             @render_plotly
             def monthly_leads_source():
-                leads_monthly = (
+                leads_summary = (
                     leads_df
                     .filter(pl.col("lead_source").is_not_null())
-                    .with_columns([
-                        pl.col("created_date").dt.strftime("%Y-%m").alias("month")
-                    ])
-                    .sort([
-                        pl.col("month").reverse(),
-                        pl.col("lead_source"),
-                        pl.col("created_date").reverse()
-                    ])
-                )
-
-                leads_summary = (
-                    leads_monthly
-                    .group_by(["month", "lead_source"])
-                    .agg(pl.count().alias("lead_count"))
-                    .sort(["month", "lead_source"])
+                    .group_by(["month_key", "lead_source"])
+                    .agg(pl.len().alias("lead_count"))
+                    # lead_source is categorical, whose codes follow the
+                    # order the data arrived in; sort the sources by name
+                    .sort(["month_key", pl.col("lead_source").cast(pl.String)])
+                    .with_columns(month_label(pl.col("month_key")).alias("month"))
                 )
 
                 fig = px.line(
-                    leads_summary.to_pandas(),
+                    leads_summary,
                     x="month",
                     y="lead_count",
                     color="lead_source",
@@ -918,12 +789,6 @@ with ui.nav_panel("FAQ"):
                 return fig
 
 with ui.nav_panel("Querychat"):
-    querychat_config = qc.init(
-        leads_df,
-        "leads_df",
-        create_chat_callback=use_anthropic_models,
-    )
-
     with ui.layout_sidebar(fillable=True, fill=True):
         qc.sidebar("chat")
 
@@ -1,50 +1,489 @@
+import asyncio
+import functools
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
 from shiny import App, render, ui, reactive
 import polars as pl
-from plotnine import *
-import matplotlib.pyplot as plt
 import io
 import base64
 import querychat
 
+from prepare_data import PLATFORMS, scan_sources
+
 # Brand colors from brand.yml
 BRAND_COLORS = ["#2563eb", "#7c3aed", "#059669", "#d97706", "#dc2626", "#0891b2", "#6366f1", "#ec4899"]
 
 # Load data
+@functools.lru_cache(maxsize=1)
+def load_static_data():
+    # The source files don't change while the app runs, so they are read
+    # once per process and shared by every session
+    
+    # Read the typed Parquet copies of the CSVs (rebuilt when stale); dates
+    # and company_size come precomputed, and platform, status, company_size
+    # and industry are enums, so filters and group-bys work on integer codes
+    leads_lf, platform_lf, quality_lf = scan_sources()
+    
+    # Same platform enum on the spend data, so it joins with the leads
+    platform_lf = platform_lf.with_columns(pl.col('platform').cast(pl.Enum(PLATFORMS)))
+    
+    leads_df, platform_df, quality_df = pl.collect_all([leads_lf, platform_lf, quality_lf])
+    
+    return leads_df, platform_df, quality_df
+
+@functools.lru_cache(maxsize=1)
+def load_leads_cube():
+    # Leads pre-aggregated per day and filter value. The dashboard filters
+    # select cells of this table and the charts sum them, instead of
+    # regrouping the individual leads on every change
+    leads_df, _, _ = load_static_data()
+    return (leads_df
+            .group_by(['created_date', 'platform', 'company_size', 'industry', 'status'])
+            .agg([
+                pl.len().alias('n'),
+                pl.col('lead_score').sum().alias('lead_score_sum'),
+                pl.col('opportunity_value').sum().alias('opportunity_value_sum')
+            ])
+            .sort('created_date'))
+
+def slice_dates(df, date_start, date_end):
+    # `df` is sorted by created_date, so the date filter is a contiguous
+    # slice found by binary search instead of a comparison on every row
+    created_dates = df['created_date']
+    lo = created_dates.search_sorted(date_start, side='left')
+    hi = created_dates.search_sorted(date_end, side='right')
+    return df.slice(lo, max(hi - lo, 0))
+
 @reactive.calc
 def load_data():
-    leads_df = pl.read_csv('salesforce_leads.csv')
-    platform_df = pl.read_csv('platform_performance.csv')
-    quality_df = pl.read_csv('lead_quality_metrics.csv')
+    return load_static_data()
+
+# The industry filter's choices: the categories of the industry enum, which
+# prepare_data.py builds sorted from the data
+INDUSTRIES = load_static_data()[0]['industry'].cat.get_categories().to_list()
+
+# Keywords the natural-language query router looks for. They are found with
+# one precompiled pattern in a single pass over the question: the lookahead
+# matches at every position (longest keyword first), and the keywords that
+# are a prefix of a match, like 'month' of 'monthly', are added with it
+QUERY_KEYWORDS = [
+    'industry', 'industries', 'tiktok', 'linkedin', 'events', 'convert', 'conversion',
+    'platform', 'count', 'how many', 'quality', 'score', 'company size', 'enterprise',
+    'small', 'medium', 'large', 'deal size', 'revenue', 'month', 'monthly', 'seasonal',
+    'trend', 'score above', 'high score', 'compare', 'overview', 'summary', 'total'
+]
+QUERY_KEYWORD_PATTERN = re.compile('(?=({}))'.format(
+    '|'.join(re.escape(keyword) for keyword in sorted(QUERY_KEYWORDS, key=len, reverse=True))
+))
+QUERY_KEYWORD_PREFIXES = {
+    keyword: {prefix for prefix in QUERY_KEYWORDS if keyword.startswith(prefix)}
+    for keyword in QUERY_KEYWORDS
+}
+
+# Platforms a question can name, by keyword, in the order they are checked
+QUERY_PLATFORMS = {'tiktok': 'TikTok', 'linkedin': 'LinkedIn', 'events': 'Events'}
+
+# The score threshold in a high-score question, e.g. "scores above 90"
+SCORE_PATTERN = re.compile(r'(\d+)')
+
+def query_keywords(question_lower):
+    # The set of QUERY_KEYWORDS contained in the question
+    keywords = set()
+    for match in QUERY_KEYWORD_PATTERN.findall(question_lower):
+        keywords |= QUERY_KEYWORD_PREFIXES[match]
+    return keywords
+
+def zip_columns(df, *columns):
+    # Rows of the given columns, zipped from lists converted in bulk instead
+    # of building a tuple of every column per row
+    return zip(*(df[column].to_list() for column in columns))
+
+def answer_text(header, lines):
+    # A query answer: the header, a blank line and the lines, joined once
+    return header + "\n\n" + "\n".join(lines)
+
+def month_label(key_col):
+    # Display form "YYYY-MM" of a month_key
+    return pl.format('{}-{}', key_col // 100, (key_col % 100).cast(pl.Utf8).str.zfill(2))
+
+def format_dollars(col):
+    # Vectorized f"${x:,.0f}": reverse the digits, comma every three, reverse
+    # back, with the sign in front of the "$"
+    amount = col.round(0).cast(pl.Int64)
+    sign = pl.when(amount < 0).then(pl.lit('-')).otherwise(pl.lit(''))
+    return sign + pl.lit('$') + (amount.abs().cast(pl.Utf8).str.reverse()
+                                 .str.replace_all(r'(\d{3})', '$1,').str.strip_chars_end(',').str.reverse())
+
+# Day names in ISO weekday order, Monday (1) to Sunday (7)
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Conversion flag and rate shared by the query aggregates; is_converted is
+# precomputed by prepare_data.py, so the status isn't compared again
+IS_CONVERTED = pl.col('is_converted')
+CONVERSION_RATE = (IS_CONVERTED.sum() / pl.len() * 100).alias('conversion_rate')
+
+# Aggregates behind the natural-language query and FAQ answers. They only
+# depend on the data, which doesn't change while the app runs, so each is
+# computed once per process (and argument) and reused by every question and
+# session. Each is built as one lazy query, so Polars can push the filters
+# and column selection down before anything is materialised
+@functools.lru_cache(maxsize=1)
+def converted_leads():
+    # The converted leads, filtered once for everything that only looks at
+    # conversions
+    leads_df, _, _ = load_static_data()
+    return leads_df.filter(IS_CONVERTED)
+
+@functools.lru_cache(maxsize=None)
+def industry_conversion(platform=None):
+    leads_lf = load_static_data()[0].lazy()
+    
+    # Filter by platform if specified
+    if platform:
+        leads_lf = leads_lf.filter(pl.col('platform') == platform)
     
-    # Convert date columns
-    leads_df = leads_df.with_columns([
-        pl.col('created_date').str.to_date('%Y-%m-%d'),
-        pl.col('conversion_date').str.to_date('%Y-%m-%d')
+    return leads_lf.group_by('industry').agg([
+        CONVERSION_RATE,
+        pl.len().alias('total_leads')
+    ]).sort('conversion_rate', descending=True).collect()
+
+@functools.lru_cache(maxsize=1)
+def platform_counts():
+    leads_df, _, _ = load_static_data()
+    return leads_df.lazy().group_by('platform').agg(pl.len().alias('count')).sort('count', descending=True).collect()
+
+@functools.lru_cache(maxsize=1)
+def platform_stats():
+    # Per-platform lead quality and revenue, best average score first.
+    # Shared by the platform quality query answers and the platform quality
+    # and ROI FAQs, which each read their columns
+    leads_df, _, _ = load_static_data()
+    converted_value = pl.col('opportunity_value').filter(IS_CONVERTED)
+    return leads_df.lazy().group_by('platform').agg([
+        pl.col('lead_score').mean().alias('avg_score'),
+        pl.col('lead_score').median().alias('median_score'),
+        CONVERSION_RATE,
+        pl.len().alias('total_leads'),
+        IS_CONVERTED.sum().alias('conversions'),
+        converted_value.sum().alias('total_revenue'),
+        converted_value.mean().alias('avg_deal_size')
+    ]).sort('avg_score', descending=True).collect()
+
+@functools.lru_cache(maxsize=1)
+def size_revenue():
+    return converted_leads().lazy().group_by('company_size').agg([
+        pl.col('opportunity_value').mean().alias('avg_deal'),
+        pl.col('opportunity_value').sum().alias('total_revenue'),
+        pl.len().alias('deals')
+    ]).sort('avg_deal', descending=True).collect()
+
+@functools.lru_cache(maxsize=1)
+def monthly_leads():
+    leads_df, _, _ = load_static_data()
+    # Grouped on the integer month key; only the grouped rows are formatted
+    return leads_df.lazy().group_by('month_key').agg([
+        pl.len().alias('leads'),
+        CONVERSION_RATE
+    ]).sort('month_key').select([
+        month_label(pl.col('month_key')).alias('month'),
+        'leads',
+        'conversion_rate'
+    ]).collect()
+
+@functools.lru_cache(maxsize=1)
+def weekday_leads():
+    # Lead counts by day of week, Monday first. The ISO weekday numbers
+    # (1-7) are named in the query, on the grouped rows
+    leads_df, _, _ = load_static_data()
+    return leads_df.lazy().group_by(
+        pl.col('created_date').dt.weekday().alias('weekday')
+    ).agg(pl.len().alias('leads')).sort('weekday').select([
+        pl.col('weekday').replace_strict(range(1, 8), WEEKDAY_NAMES).alias('day'),
+        'leads'
+    ]).collect()
+
+@functools.lru_cache(maxsize=32)
+def high_score_leads(threshold):
+    # Total, per-platform counts and conversion rate of the leads scoring at
+    # least `threshold`
+    leads_df, _, _ = load_static_data()
+    high_score = leads_df.lazy().filter(pl.col('lead_score') >= threshold)
+    
+    # Both queries share the score filter, which collect_all runs once. The
+    # streaming engine processes the leads in batches, so memory stays
+    # bounded by the aggregates rather than the filtered rows
+    counts, platform_breakdown = pl.collect_all([
+        high_score.select([pl.len().alias('total'), (IS_CONVERTED.mean() * 100).alias('conversion_rate')]),
+        high_score.group_by('platform').agg(pl.len().alias('count')).sort('count', descending=True)
+    ], engine='streaming')
+    total, conversion_rate = counts.row(0)
+    # The mean is null when no lead reaches the threshold
+    return total, platform_breakdown, conversion_rate or 0
+
+@functools.lru_cache(maxsize=1)
+def leads_overview():
+    # All the overview figures in one pass over the leads
+    leads_df, _, _ = load_static_data()
+    converted_value = pl.col('opportunity_value').filter(IS_CONVERTED)
+    overview = leads_df.select([
+        pl.len().alias('total_leads'),
+        IS_CONVERTED.sum().alias('converted_leads'),
+        converted_value.sum().alias('total_revenue'),
+        converted_value.mean().alias('avg_deal_size'),
+        pl.col('lead_score').mean().alias('avg_lead_score')
+    ]).row(0, named=True)
+    
+    total_leads = overview['total_leads']
+    overview['conversion_rate'] = (overview['converted_leads'] / total_leads * 100) if total_leads > 0 else 0
+    return overview
+
+# Static parts of the query responses, built once instead of on every click
+QUERY_QUESTION_STYLE = "color: #2c3e50; margin-bottom: 15px;"
+QUERY_ERROR_STYLE = "color: #e74c3c;"
+EMPTY_QUERY_RESPONSE = ui.div(
+    ui.h4("Please enter a question", style=QUERY_ERROR_STYLE),
+    class_="chat-response"
+)
+
+# Answers to the natural-language query types. Each handler gets the
+# lowercased question and its router keywords, and returns None when the
+# question doesn't ask for something it can answer
+def answer_platform_industries(question_lower, keywords):
+    # Industry conversion for one platform
+    if keywords & {'convert', 'conversion'}:
+        # Check if question is asking about a specific platform
+        platform_filter = next((platform for keyword, platform in QUERY_PLATFORMS.items() if keyword in keywords), None)
+        
+        # Every platform lead is in one of the industry groups, so
+        # no groups means no leads
+        platform_conversion = industry_conversion(platform_filter)
+        
+        if platform_conversion.height == 0:
+            return f"No leads found for {platform_filter}."
+        
+        lines = [f"• {industry}: {rate:.1f}% ({total} leads)"
+                 for industry, rate, total in zip_columns(platform_conversion, 'industry', 'conversion_rate', 'total_leads')]
+        return answer_text(f"**Industry conversion rates for {platform_filter}:**", lines)
+
+def answer_platforms(question_lower, keywords):
+    if keywords & {'count', 'how many'}:
+        lines = [f"• {platform}: {count} leads" for platform, count in zip_columns(platform_counts(), 'platform', 'count')]
+        return answer_text("**Lead counts by platform:**", lines)
+    
+    elif keywords & {'quality', 'score'}:
+        lines = [f"• {platform}: {score:.1f} avg score, {rate:.1f}% conversion"
+                 for platform, score, rate in zip_columns(platform_stats(), 'platform', 'avg_score', 'conversion_rate')]
+        return answer_text("**Platform quality comparison:**", lines)
+
+def answer_industries(question_lower, keywords):
+    if keywords & {'convert', 'conversion'}:
+        industry_rates = industry_conversion().filter(pl.col('total_leads') >= 2)
+        
+        if industry_rates.height == 0:
+            return "No industries with sufficient data found."
+        
+        lines = [f"• {industry}: {rate:.1f}% ({total} leads)"
+                 for industry, rate, total in zip_columns(industry_rates, 'industry', 'conversion_rate', 'total_leads')]
+        return answer_text("**Industry conversion rates:**", lines)
+
+def answer_company_sizes(question_lower, keywords):
+    if keywords & {'deal size', 'revenue'}:
+        lines = size_revenue().select(pl.format('• {}: {} avg deal, {} total ({} deals)',
+                                                'company_size',
+                                                format_dollars(pl.col('avg_deal')),
+                                                format_dollars(pl.col('total_revenue')),
+                                                'deals'))
+        lines = lines.to_series().to_list()
+        return answer_text("**Revenue by company size:**", lines)
+
+def answer_monthly(question_lower, keywords):
+    monthly_data = monthly_leads()
+    
+    if 'conversion' in keywords:
+        best_month = monthly_data.row(monthly_data['conversion_rate'].arg_max())
+        lines = [f"• {month}: {rate:.1f}% conversion ({leads} leads)"
+                 for month, leads, rate in zip_columns(monthly_data, 'month', 'leads', 'conversion_rate')]
+        return answer_text("**Monthly conversion rates:**", [
+            f"Best month: {best_month[0]} with {best_month[2]:.1f}% conversion",
+            "",
+            *lines
+        ])
+    
+    lines = [f"• {month}: {leads} leads ({rate:.1f}% conversion)"
+             for month, leads, rate in zip_columns(monthly_data, 'month', 'leads', 'conversion_rate')]
+    return answer_text("**Monthly lead generation:**", lines)
+
+def answer_high_scores(question_lower, keywords):
+    score_match = SCORE_PATTERN.search(question_lower)
+    threshold = int(score_match.group(1)) if score_match else 80
+    
+    total, platform_breakdown, conversion_rate = high_score_leads(threshold)
+    lines = [f"• {platform}: {count} leads" for platform, count in zip_columns(platform_breakdown, 'platform', 'count')]
+    return answer_text(f"**Leads with scores ≥ {threshold}:**", [
+        f"Total: {total} leads",
+        "",
+        "**By platform:**",
+        *lines,
+        "",
+        f"**Conversion rate**: {conversion_rate:.1f}%"
     ])
+
+def answer_quality_comparison(question_lower, keywords):
+    blocks = [
+        f"**{platform}:**\n"
+        f"  • Average Score: {avg_score:.1f}\n"
+        f"  • Median Score: {median_score:.1f}\n"
+        f"  • Conversion Rate: {rate:.1f}%\n"
+        f"  • Total Leads: {total}"
+        for platform, avg_score, median_score, rate, total in zip_columns(
+            platform_stats(), 'platform', 'avg_score', 'median_score', 'conversion_rate', 'total_leads')
+    ]
+    # A blank line between the platforms keeps each block its own paragraph
+    return answer_text("**Lead Quality Comparison by Platform:**", ["\n\n".join(blocks)])
+
+def answer_overview(question_lower, keywords):
+    overview = leads_overview()
     
-    # Add company size categories
-    leads_df = leads_df.with_columns(
-        pl.when(pl.col('employees') < 50)
-        .then(pl.lit('Small (< 50)'))
-        .when(pl.col('employees') <= 250)
-        .then(pl.lit('Medium (50-250)'))
-        .when(pl.col('employees') <= 500)
-        .then(pl.lit('Large (251-500)'))
-        .otherwise(pl.lit('Enterprise (500+)'))
-        .alias('company_size')
-    )
+    return answer_text("**Data Overview:**", [
+        f"• **Total Leads**: {overview['total_leads']}",
+        f"• **Converted Leads**: {overview['converted_leads']}",
+        f"• **Overall Conversion Rate**: {overview['conversion_rate']:.1f}%",
+        f"• **Total Revenue**: ${overview['total_revenue']:,.0f}",
+        f"• **Average Deal Size**: ${overview['avg_deal_size']:,.0f}",
+        f"• **Average Lead Score**: {overview['avg_lead_score']:.1f}"
+    ])
+
+# Query routes in priority order: the first route whose keyword groups each
+# share a keyword with the question answers it
+QUERY_ROUTES = [
+    # Platform-specific industry queries first
+    (({'industry', 'industries'}, set(QUERY_PLATFORMS)), answer_platform_industries),
+    (({'platform', *QUERY_PLATFORMS},), answer_platforms),
+    (({'industry', 'industries'},), answer_industries),
+    (({'company size', 'enterprise', 'small', 'medium', 'large'},), answer_company_sizes),
+    (({'month', 'monthly', 'seasonal', 'trend'},), answer_monthly),
+    (({'score above', 'high score'},), answer_high_scores),
+    (({'compare'}, {'quality'}), answer_quality_comparison),
+    (({'overview', 'summary', 'total'},), answer_overview),
+]
+
+# Chart helpers. The charts are drawn with matplotlib directly, styled like a
+# minimal ggplot theme with the brand title/axis colors. Figures are created
+# without pyplot, whose global figure list isn't safe to use from the worker
+# threads the charts are drawn in. numpy and matplotlib are imported by the
+# chart code when it first runs, so the server starts without loading them
+def new_chart(width, height):
+    from matplotlib.figure import Figure
     
-    return leads_df, platform_df, quality_df
+    fig = Figure(figsize=(width, height))
+    ax = fig.subplots()
+    ax.grid(color='#f1f5f9')
+    ax.set_axisbelow(True)
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+    ax.tick_params(length=0, labelsize=10, labelcolor='#4d4d4d')
+    return fig, ax
+
+def label_chart(ax, title, x, y):
+    ax.set_title(title, fontsize=16, fontweight='bold', color='#1e293b')
+    ax.set_xlabel(x, fontsize=12, color='#64748b')
+    ax.set_ylabel(y, fontsize=12, color='#64748b')
+
+def add_legend(ax, title, *args):
+    # Legend outside the plot area on the right
+    ax.legend(*args, title=title, title_fontproperties={'size': 12, 'weight': 'bold'},
+              frameon=False, loc='center left', bbox_to_anchor=(1.02, 0.5))
+
+def platform_colors(platforms):
+    # Brand colors assigned to the platforms shown, in alphabetical order
+    return dict(zip(sorted(platforms), BRAND_COLORS))
 
-# Helper function to convert plotnine plot to base64 for Shiny
-def plot_to_base64(plot, width=8, height=6, dpi=300):
-    fig = plot.draw()
+def dodged_bars(ax, df, x, y):
+    # Side-by-side bars for each x category, one color per platform
+    categories = df[x].unique().sort().to_list()
+    colors = platform_colors(df['platform'].unique())
+    width = 0.9 / len(colors)
+    for i, (platform, color) in enumerate(colors.items()):
+        rows = df.filter(pl.col('platform') == platform)
+        positions = [categories.index(c) - 0.45 + width * (i + 0.5) for c in rows[x]]
+        ax.bar(positions, rows[y].to_numpy(), width=width, color=color, label=platform)
+    ax.set_xticks(range(len(categories)), categories)
+
+def quality_stats(leads_cube, by):
+    # Lead count, average lead score and conversion rate per `by` value;
+    # means are taken from the cube's sums
+    return (leads_cube
+            .group_by(by)
+            .agg([
+                pl.col('n').sum().alias('lead_count'),
+                (pl.col('lead_score_sum').sum() / pl.col('n').sum()).alias('avg_lead_score'),
+                (pl.col('n').filter(pl.col('status') == 'Converted').sum() / pl.col('n').sum() * 100).alias('conversion_rate')
+            ]))
+
+# Helper function to convert a matplotlib figure to base64 for Shiny. The
+# figure gets its own Agg canvas, so nothing is registered with pyplot and
+# the figure is garbage collected once the image is encoded. The charts are
+# shown at screen size, so a screen DPI and WebP keep the data URLs small.
+# WebP encoder method 2 (of 0-6, default 4) saves about a quarter of the
+# save time for a couple of percent larger images. The tight bounding box
+# stays: it makes room for the legends drawn outside the axes
+def plot_to_base64(fig, dpi=110):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    
     buf = io.BytesIO()
-    fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight')
-    buf.seek(0)
-    img_str = base64.b64encode(buf.read()).decode()
-    plt.close(fig)
-    return f"data:image/png;base64,{img_str}"
+    FigureCanvasAgg(fig).print_figure(buf, format='webp', dpi=dpi, bbox_inches='tight',
+                                      pil_kwargs={'method': 2})
+    img_str = base64.b64encode(buf.getbuffer()).decode()
+    return f"data:image/webp;base64,{img_str}"
+
+# FAQ answers by question; they only depend on the data, which doesn't change
+# while the app runs
+faq_answers = {}
+
+# How long the filter inputs must stay unchanged before the outputs update
+FILTER_DEBOUNCE_SECS = 0.25
+
+# Rendered charts by (chart name, filter state), shared by all sessions.
+# Drawing and image-encoding dominate a chart update, so a filter state that
+# comes back is served from here; the oldest entries are evicted first
+CHART_CACHE_SIZE = 64
+chart_cache = OrderedDict()
+chart_cache_lock = threading.Lock()
+
+async def cached_charts(charts):
+    # `charts` maps each chart name to its (cache key, data function, draw
+    # function); returns the rendered chart by name. The charts missing from
+    # the cache have their reactive data read here on the event loop, and are
+    # then drawn and encoded at the same time in worker threads, so a filter
+    # change costs about the slowest chart rather than the sum of all of them
+    rendered = {}
+    missing = {}
+    with chart_cache_lock:
+        for name, (key, chart_data, draw_chart) in charts.items():
+            if key in chart_cache:
+                chart_cache.move_to_end(key)
+                rendered[name] = chart_cache[key]
+            else:
+                missing[name] = (key, chart_data, draw_chart)
+    
+    drawn = await asyncio.gather(*(
+        asyncio.to_thread(draw_chart, chart_data())
+        for key, chart_data, draw_chart in missing.values()
+    ))
+    
+    with chart_cache_lock:
+        for (name, (key, _, _)), chart in zip(missing.items(), drawn):
+            rendered[name] = chart
+            chart_cache[key] = chart
+            chart_cache.move_to_end(key)
+        while len(chart_cache) > CHART_CACHE_SIZE:
+            chart_cache.popitem(last=False)
+    return rendered
 
 # UI
 app_ui = ui.page_fluid(
@@ -299,8 +738,8 @@ app_ui = ui.page_fluid(
                     ui.input_selectize(
                         "industries",
                         "Industries",
-                        choices=[],
-                        selected=[],
+                        choices=INDUSTRIES,
+                        selected=INDUSTRIES,
                         multiple=True
                     ),
                     ui.br(),
@@ -427,52 +866,117 @@ app_ui = ui.page_fluid(
 # Server
 def server(input, output, session):
     
-    # Update industry choices based on data
+    # Filter state
+    @reactive.calc
+    def filter_inputs():
+        # The filter inputs as they are right now, as a hashable key
+        return (
+            input.date_range(),
+            tuple(sorted(input.platforms())),
+            tuple(sorted(input.company_sizes())),
+            tuple(sorted(input.industries())),
+            tuple(sorted(input.lead_status()))
+        )
+    
+    # The filter state the outputs use only follows the inputs once they
+    # have been still for FILTER_DEBOUNCE_SECS, so a burst of checkbox
+    # toggles recomputes the KPIs and charts once instead of per click
+    settled_filters = reactive.value(None)
+    filters_due = reactive.value(None)
+    
     @reactive.effect
-    def update_industry_choices():
-        leads_df, _, _ = load_data()
-        industries = sorted(leads_df['industry'].unique().to_list())
-        ui.update_selectize("industries", choices=industries, selected=industries)
+    def schedule_filters():
+        state = filter_inputs()
+        with reactive.isolate():
+            settled = settled_filters()
+        if settled is None:
+            # The first state is used right away
+            settled_filters.set(state)
+        elif state != settled:
+            filters_due.set(time.monotonic() + FILTER_DEBOUNCE_SECS)
+        else:
+            # Changed back before the delay ran out
+            filters_due.set(None)
+    
+    @reactive.effect
+    def apply_filters():
+        due = filters_due()
+        if due is None:
+            return
+        remaining = due - time.monotonic()
+        if remaining > 0:
+            reactive.invalidate_later(remaining)
+            return
+        filters_due.set(None)
+        with reactive.isolate():
+            settled_filters.set(filter_inputs())
+    
+    @reactive.calc
+    def filter_key():
+        # The settled filter state, also the chart cache key. It falls back
+        # to the inputs until the first state is settled
+        settled = settled_filters()
+        return filter_inputs() if settled is None else settled
     
     # Filtered data
     @reactive.calc
-    def filtered_data():
-        leads_df, platform_df, quality_df = load_data()
-        
-        # Apply filters
-        filtered_leads = leads_df
-        
-        # Date filter
-        date_start, date_end = input.date_range()
-        filtered_leads = filtered_leads.filter(
-            (pl.col('created_date') >= pl.lit(date_start)) &
-            (pl.col('created_date') <= pl.lit(date_end))
-        )
+    def lead_filters():
+        # The category filters as one predicate, applied in a single pass to
+        # both the leads and the pre-aggregated cube once they are sliced to
+        # the date range
+        _, platforms, company_sizes, industries, lead_status = filter_key()
+        filters = [pl.lit(True)]
         
         # Platform filter
-        if input.platforms():
-            filtered_leads = filtered_leads.filter(pl.col('platform').is_in(input.platforms()))
+        if platforms:
+            filters.append(pl.col('platform').is_in(platforms))
         
         # Company size filter
-        if input.company_sizes():
-            filtered_leads = filtered_leads.filter(pl.col('company_size').is_in(input.company_sizes()))
+        if company_sizes:
+            filters.append(pl.col('company_size').is_in(company_sizes))
         
         # Industry filter
-        if input.industries():
-            filtered_leads = filtered_leads.filter(pl.col('industry').is_in(input.industries()))
+        if industries:
+            filters.append(pl.col('industry').is_in(industries))
         
         # Status filter
-        if input.lead_status():
-            filtered_leads = filtered_leads.filter(pl.col('status').is_in(input.lead_status()))
+        if lead_status:
+            filters.append(pl.col('status').is_in(lead_status))
         
+        return pl.all_horizontal(filters)
+    
+    @reactive.calc
+    def filtered_data():
+        # The filtered leads stay lazy: each output selects the columns it
+        # needs before collecting, so the filter only gathers those
+        leads_df, platform_df, quality_df = load_data()
+        date_start, date_end = filter_key()[0]
+        filtered_leads = slice_dates(leads_df, date_start, date_end).lazy().filter(lead_filters())
         return filtered_leads, platform_df, quality_df
     
+    @reactive.calc
+    def filtered_cube():
+        date_start, date_end = filter_key()[0]
+        return (slice_dates(load_leads_cube(), date_start, date_end)
+                .lazy().filter(lead_filters()).collect())
+    
     # KPI Cards
+    @reactive.calc
+    def kpi_values():
+        # All four KPIs in one pass over the filtered leads
+        filtered_leads, _, _ = filtered_data()
+        converted_value = pl.col('opportunity_value').filter(pl.col('is_converted'))
+        return filtered_leads.select([
+            pl.len().alias('total_leads'),
+            pl.col('is_converted').sum().alias('converted'),
+            converted_value.mean().alias('avg_deal'),
+            converted_value.sum().alias('total_revenue')
+        ]).collect().row(0, named=True)
+    
     @output
     @render.ui
     def kpi_total_leads():
-        filtered_leads, _, _ = filtered_data()
-        total_leads = filtered_leads.height
+        total_leads = kpi_values()['total_leads']
         return ui.div(
             ui.div(str(total_leads), class_="metric-value"),
             ui.div("Total Leads", class_="metric-label"),
@@ -482,9 +986,9 @@ def server(input, output, session):
     @output
     @render.ui
     def kpi_conversion_rate():
-        filtered_leads, _, _ = filtered_data()
-        if filtered_leads.height > 0:
-            conversion_rate = (filtered_leads.filter(pl.col('status') == 'Converted').height / filtered_leads.height) * 100
+        kpis = kpi_values()
+        if kpis['total_leads'] > 0:
+            conversion_rate = (kpis['converted'] / kpis['total_leads']) * 100
             return ui.div(
                 ui.div(f"{conversion_rate:.1f}%", class_="metric-value"),
                 ui.div("Conversion Rate", class_="metric-label"),
@@ -499,10 +1003,9 @@ def server(input, output, session):
     @output
     @render.ui
     def kpi_avg_deal_size():
-        filtered_leads, _, _ = filtered_data()
-        converted_leads = filtered_leads.filter(pl.col('status') == 'Converted')
-        if converted_leads.height > 0:
-            avg_deal = converted_leads['opportunity_value'].mean()
+        kpis = kpi_values()
+        if kpis['converted'] > 0:
+            avg_deal = kpis['avg_deal']
             return ui.div(
                 ui.div(f"${avg_deal:,.0f}", class_="metric-value"),
                 ui.div("Avg Deal Size", class_="metric-label"),
@@ -517,9 +1020,7 @@ def server(input, output, session):
     @output
     @render.ui
     def kpi_total_revenue():
-        filtered_leads, _, _ = filtered_data()
-        converted_leads = filtered_leads.filter(pl.col('status') == 'Converted')
-        total_revenue = converted_leads['opportunity_value'].sum()
+        total_revenue = kpi_values()['total_revenue']
         return ui.div(
             ui.div(f"${total_revenue:,.0f}", class_="metric-value"),
             ui.div("Total Revenue", class_="metric-label"),
@@ -527,353 +1028,342 @@ def server(input, output, session):
         )
     
     # Charts
+    @reactive.calc
+    async def charts():
+        # All six charts for the current filters, drawn together by
+        # cached_charts; each chart output reads its own entry
+        key = filter_key()
+        
+        # Only converted leads are shown in the revenue chart, so of the
+        # status filter only whether it lets them through matters: toggling
+        # another status serves the cached chart instead of drawing the same
+        # one again
+        date_range, platforms, company_sizes, industries, lead_status = key
+        shows_converted = not lead_status or 'Converted' in lead_status
+        revenue_key = ('revenue_analysis_chart', date_range, platforms, company_sizes, industries, shows_converted)
+        
+        return await cached_charts({
+            'leads_trend_chart': (('leads_trend_chart', key), filtered_cube, draw_leads_trend),
+            'platform_performance_chart': (('platform_performance_chart', key), filtered_cube, draw_platform_performance),
+            'conversion_funnel_chart': (('conversion_funnel_chart', key), filtered_cube, draw_conversion_funnel),
+            'lead_score_distribution': (('lead_score_distribution', key),
+                                        lambda: filtered_data()[0].select(['lead_score', 'platform']).collect(),
+                                        draw_lead_score_distribution),
+            'industry_performance_chart': (('industry_performance_chart', key), filtered_cube, draw_industry_performance),
+            'revenue_analysis_chart': (revenue_key, filtered_cube, draw_revenue_analysis)
+        })
+    
     @output
     @render.ui
-    def leads_trend_chart():
-        filtered_leads, _, _ = filtered_data()
-        
+    async def leads_trend_chart():
+        return (await charts())['leads_trend_chart']
+    
+    def draw_leads_trend(leads_cube):
         # Group by month and platform
-        trend_data = (filtered_leads
+        trend_data = (leads_cube
                      .with_columns(pl.col('created_date').dt.strftime('%Y-%m').alias('month'))
                      .group_by(['month', 'platform'])
-                     .agg(pl.len().alias('leads'))
-                     .sort(['month', 'platform'])
-                     .to_pandas())
+                     .agg(pl.col('n').sum().alias('leads'))
+                     .sort(['month', 'platform']))
         
         if len(trend_data) == 0:
             return ui.div("No data available")
         
-        plot = (ggplot(trend_data, aes(x='month', y='leads', color='platform', group='platform')) +
-                geom_line(size=1.5) +
-                geom_point(size=3) +
-                theme_minimal() +
-                scale_color_manual(values=BRAND_COLORS[:len(trend_data['platform'].unique())]) +
-                labs(title='Lead Generation Trends by Platform',
-                     x='Month', y='Number of Leads', color='Platform') +
-                theme(axis_text_x=element_text(rotation=45, size=10),
-                      plot_title=element_text(size=16, weight='bold', color='#1e293b'),
-                      axis_title=element_text(size=12, color='#64748b'),
-                      legend_title=element_text(size=12, weight='bold'),
-                      panel_grid_major=element_line(color='#f1f5f9'),
-                      panel_grid_minor=element_blank()))
-        
-        img_str = plot_to_base64(plot, width=8, height=5)
+        months = trend_data['month'].unique().sort().to_list()
+        fig, ax = new_chart(8, 5)
+        for platform, color in platform_colors(trend_data['platform'].unique()).items():
+            rows = trend_data.filter(pl.col('platform') == platform)
+            ax.plot([months.index(m) for m in rows['month']], rows['leads'].to_numpy(),
+                    color=color, linewidth=3, marker='o', markersize=7, label=platform)
+        ax.set_xticks(range(len(months)), months, rotation=45)
+        label_chart(ax, 'Lead Generation Trends by Platform', 'Month', 'Number of Leads')
+        add_legend(ax, 'Platform')
+        
+        img_str = plot_to_base64(fig)
         return ui.img(src=img_str, style="max-width: 100%; height: auto;")
     
     @output
     @render.ui
-    def platform_performance_chart():
-        filtered_leads, _, _ = filtered_data()
-        
+    async def platform_performance_chart():
+        return (await charts())['platform_performance_chart']
+    
+    def draw_platform_performance(leads_cube):
         # Platform performance metrics
-        platform_stats = (filtered_leads
-                         .group_by('platform')
-                         .agg([
-                             pl.col('lead_score').mean().alias('avg_lead_score'),
-                             (pl.col('status').eq('Converted').sum() / pl.len() * 100).alias('conversion_rate')
-                         ])
-                         .to_pandas())
+        platform_stats = quality_stats(leads_cube, 'platform').sort('platform')
         
         if len(platform_stats) == 0:
             return ui.div("No data available")
         
-        plot = (ggplot(platform_stats, aes(x='platform')) +
-                geom_col(aes(y='avg_lead_score'), fill=BRAND_COLORS[0], alpha=0.8) +
-                geom_point(aes(y='conversion_rate'), color=BRAND_COLORS[2], size=4) +
-                geom_line(aes(y='conversion_rate', group=1), color=BRAND_COLORS[2], size=1.5) +
-                theme_minimal() +
-                labs(title='Platform Performance: Lead Score vs Conversion Rate',
-                     x='Platform', y='Average Lead Score') +
-                theme(plot_title=element_text(size=16, weight='bold', color='#1e293b'),
-                      axis_title=element_text(size=12, color='#64748b'),
-                      axis_text=element_text(size=10),
-                      panel_grid_major=element_line(color='#f1f5f9'),
-                      panel_grid_minor=element_blank()))
+        fig, ax = new_chart(8, 5)
+        platforms = platform_stats['platform'].to_list()
+        ax.bar(platforms, platform_stats['avg_lead_score'].to_numpy(),
+               color=BRAND_COLORS[0], alpha=0.8)
+        ax.plot(platforms, platform_stats['conversion_rate'].to_numpy(),
+                color=BRAND_COLORS[2], linewidth=3, marker='o', markersize=9)
+        label_chart(ax, 'Platform Performance: Lead Score vs Conversion Rate',
+                    'Platform', 'Average Lead Score')
         
-        img_str = plot_to_base64(plot, width=8, height=5)
+        img_str = plot_to_base64(fig)
         return ui.img(src=img_str, style="max-width: 100%; height: auto;")
     
     @output
     @render.ui
-    def conversion_funnel_chart():
-        filtered_leads, _, _ = filtered_data()
-        
-        # Conversion funnel by platform
-        funnel_data = []
-        for platform in filtered_leads['platform'].unique().to_list():
-            platform_leads = filtered_leads.filter(pl.col('platform') == platform)
-            total = platform_leads.height
-            qualified = platform_leads.filter(pl.col('status').is_in(['Qualified', 'Opportunity', 'Converted'])).height
-            converted = platform_leads.filter(pl.col('status') == 'Converted').height
-            
-            funnel_data.extend([
-                {'platform': platform, 'stage': 'Total Leads', 'count': total},
-                {'platform': platform, 'stage': 'Qualified', 'count': qualified},
-                {'platform': platform, 'stage': 'Converted', 'count': converted}
-            ])
-        
-        funnel_df = pl.DataFrame(funnel_data).to_pandas()
+    async def conversion_funnel_chart():
+        return (await charts())['conversion_funnel_chart']
+    
+    def draw_conversion_funnel(leads_cube):
+        # Conversion funnel by platform, one row per platform and stage
+        funnel_df = (leads_cube
+                    .group_by('platform')
+                    .agg([
+                        pl.col('n').sum().alias('Total Leads'),
+                        pl.col('n').filter(pl.col('status').is_in(['Qualified', 'Opportunity', 'Converted'])).sum().alias('Qualified'),
+                        pl.col('n').filter(pl.col('status') == 'Converted').sum().alias('Converted')
+                    ])
+                    .unpivot(index='platform', variable_name='stage', value_name='count'))
         
         if len(funnel_df) == 0:
             return ui.div("No data available")
         
-        plot = (ggplot(funnel_df, aes(x='stage', y='count', fill='platform')) +
-                geom_col(position='dodge') +
-                theme_minimal() +
-                scale_fill_manual(values=BRAND_COLORS[:len(funnel_df['platform'].unique())]) +
-                labs(title='Conversion Funnel by Platform',
-                     x='Stage', y='Number of Leads', fill='Platform') +
-                theme(plot_title=element_text(size=16, weight='bold', color='#1e293b'),
-                      axis_title=element_text(size=12, color='#64748b'),
-                      axis_text=element_text(size=10),
-                      legend_title=element_text(size=12, weight='bold'),
-                      panel_grid_major=element_line(color='#f1f5f9'),
-                      panel_grid_minor=element_blank()))
+        fig, ax = new_chart(8, 5)
+        dodged_bars(ax, funnel_df, 'stage', 'count')
+        label_chart(ax, 'Conversion Funnel by Platform', 'Stage', 'Number of Leads')
+        add_legend(ax, 'Platform')
         
-        img_str = plot_to_base64(plot, width=8, height=5)
+        img_str = plot_to_base64(fig)
         return ui.img(src=img_str, style="max-width: 100%; height: auto;")
     
     @output
     @render.ui
-    def lead_score_distribution():
-        filtered_leads, _, _ = filtered_data()
-        
-        leads_pd = filtered_leads.to_pandas()
+    async def lead_score_distribution():
+        return (await charts())['lead_score_distribution']
+    
+    def draw_lead_score_distribution(filtered_leads):
+        import numpy as np
         
-        if len(leads_pd) == 0:
+        if filtered_leads.height == 0:
             return ui.div("No data available")
         
-        plot = (ggplot(leads_pd, aes(x='lead_score', fill='platform')) +
-                geom_histogram(alpha=0.8, bins=20, position='identity') +
-                theme_minimal() +
-                scale_fill_manual(values=BRAND_COLORS[:len(leads_pd['platform'].unique())]) +
-                labs(title='Lead Score Distribution by Platform',
-                     x='Lead Score', y='Count', fill='Platform') +
-                theme(plot_title=element_text(size=16, weight='bold', color='#1e293b'),
-                      axis_title=element_text(size=12, color='#64748b'),
-                      axis_text=element_text(size=10),
-                      legend_title=element_text(size=12, weight='bold'),
-                      panel_grid_major=element_line(color='#f1f5f9'),
-                      panel_grid_minor=element_blank()))
-        
-        img_str = plot_to_base64(plot, width=8, height=5)
+        # 20 bins over the shown scores, shared by all platforms. The counts
+        # for every platform come from one bincount over (platform code, bin)
+        # instead of a filter and histogram per platform
+        scores = filtered_leads['lead_score'].to_numpy()
+        bin_edges = np.histogram_bin_edges(scores, bins=20)
+        bins = np.clip(np.searchsorted(bin_edges, scores, side='right') - 1, 0, 19)
+        codes = filtered_leads['platform'].to_physical().to_numpy().astype(np.intp)
+        counts = np.bincount(codes * 20 + bins, minlength=len(PLATFORMS) * 20).reshape(len(PLATFORMS), 20)
+        
+        fig, ax = new_chart(8, 5)
+        for platform, color in platform_colors(filtered_leads['platform'].unique()).items():
+            ax.bar(bin_edges[:-1], counts[PLATFORMS.index(platform)], width=np.diff(bin_edges),
+                   align='edge', color=color, alpha=0.8, label=platform)
+        label_chart(ax, 'Lead Score Distribution by Platform', 'Lead Score', 'Count')
+        add_legend(ax, 'Platform')
+        
+        img_str = plot_to_base64(fig)
         return ui.img(src=img_str, style="max-width: 100%; height: auto;")
     
     @output
     @render.ui
-    def industry_performance_chart():
-        filtered_leads, _, _ = filtered_data()
+    async def industry_performance_chart():
+        return (await charts())['industry_performance_chart']
+    
+    def draw_industry_performance(leads_cube):
+        from matplotlib.ticker import MaxNLocator
         
         # Industry performance
-        industry_stats = (filtered_leads
-                         .group_by('industry')
-                         .agg([
-                             pl.len().alias('lead_count'),
-                             pl.col('lead_score').mean().alias('avg_lead_score'),
-                             (pl.col('status').eq('Converted').sum() / pl.len() * 100).alias('conversion_rate')
-                         ])
-                         .filter(pl.col('lead_count') >= 2)
-                         .to_pandas())
+        industry_stats = quality_stats(leads_cube, 'industry').filter(pl.col('lead_count') >= 2)
         
         if len(industry_stats) == 0:
             return ui.div("No data available")
         
-        plot = (ggplot(industry_stats, aes(x='avg_lead_score', y='conversion_rate', size='lead_count')) +
-                geom_point(alpha=0.8, color=BRAND_COLORS[0]) +
-                theme_minimal() +
-                labs(title='Industry Performance: Lead Score vs Conversion Rate',
-                     x='Average Lead Score', y='Conversion Rate (%)', size='Lead Count') +
-                theme(plot_title=element_text(size=16, weight='bold', color='#1e293b'),
-                      axis_title=element_text(size=12, color='#64748b'),
-                      axis_text=element_text(size=10),
-                      legend_title=element_text(size=12, weight='bold'),
-                      panel_grid_major=element_line(color='#f1f5f9'),
-                      panel_grid_minor=element_blank()))
-        
-        img_str = plot_to_base64(plot, width=10, height=5)
+        # Marker area grows with the lead count
+        counts = industry_stats['lead_count'].to_numpy()
+        low, high = counts.min(), max(counts.max(), counts.min() + 1)
+        to_size = lambda c: 30 + 170 * (c - low) / (high - low)
+        to_count = lambda size: low + (size - 30) * (high - low) / 170
+        
+        fig, ax = new_chart(10, 5)
+        points = ax.scatter(industry_stats['avg_lead_score'].to_numpy(), industry_stats['conversion_rate'].to_numpy(),
+                            s=to_size(counts), color=BRAND_COLORS[0], alpha=0.8)
+        label_chart(ax, 'Industry Performance: Lead Score vs Conversion Rate',
+                    'Average Lead Score', 'Conversion Rate (%)')
+        add_legend(ax, 'Lead Count', *points.legend_elements(
+            prop='sizes', num=MaxNLocator(4, integer=True), func=to_count,
+            color=BRAND_COLORS[0], alpha=0.8))
+        
+        img_str = plot_to_base64(fig)
         return ui.img(src=img_str, style="max-width: 100%; height: auto;")
     
     @output
     @render.ui
-    def revenue_analysis_chart():
-        filtered_leads, _, _ = filtered_data()
+    async def revenue_analysis_chart():
+        return (await charts())['revenue_analysis_chart']
+    
+    def draw_revenue_analysis(leads_cube):
+        from matplotlib.ticker import FuncFormatter
         
         # Revenue by platform and company size
-        revenue_data = (filtered_leads
+        revenue_data = (leads_cube
                        .filter(pl.col('status') == 'Converted')
                        .group_by(['platform', 'company_size'])
-                       .agg(pl.col('opportunity_value').sum().alias('revenue'))
-                       .to_pandas())
+                       .agg(pl.col('opportunity_value_sum').sum().alias('revenue')))
         
         if len(revenue_data) == 0:
             return ui.div("No data available")
         
-        plot = (ggplot(revenue_data, aes(x='company_size', y='revenue', fill='platform')) +
-                geom_col(position='dodge') +
-                theme_minimal() +
-                scale_fill_manual(values=BRAND_COLORS[:len(revenue_data['platform'].unique())]) +
-                labs(title='Revenue by Company Size and Platform',
-                     x='Company Size', y='Revenue ($)', fill='Platform') +
-                theme(axis_text_x=element_text(rotation=45, size=10),
-                      plot_title=element_text(size=16, weight='bold', color='#1e293b'),
-                      axis_title=element_text(size=12, color='#64748b'),
-                      axis_text=element_text(size=10),
-                      legend_title=element_text(size=12, weight='bold'),
-                      panel_grid_major=element_line(color='#f1f5f9'),
-                      panel_grid_minor=element_blank()) +
-                scale_y_continuous(labels=lambda l: [f'${x/1000:.0f}K' for x in l]))
+        fig, ax = new_chart(10, 5)
+        dodged_bars(ax, revenue_data, 'company_size', 'revenue')
+        ax.tick_params(axis='x', rotation=45)
+        ax.yaxis.set_major_formatter(FuncFormatter(lambda value, _: f'${value/1000:.0f}K'))
+        label_chart(ax, 'Revenue by Company Size and Platform', 'Company Size', 'Revenue ($)')
+        add_legend(ax, 'Platform')
         
-        img_str = plot_to_base64(plot, width=10, height=5)
+        img_str = plot_to_base64(fig)
         return ui.img(src=img_str, style="max-width: 100%; height: auto;")
     
     # Download handler
     @session.download(filename="filtered_leads.csv")
     def download_data():
         filtered_leads, _, _ = filtered_data()
-        return filtered_leads.write_csv()
+        # The streaming engine writes the CSV straight from the lazy filter
+        # to a temporary file, without collecting the filtered leads. The
+        # flag and month key are internal helper columns
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_path = os.path.join(tmp_dir, 'filtered_leads.csv')
+            filtered_leads.drop(['is_converted', 'month_key']).sink_csv(csv_path)
+            
+            # Yielded as bytes chunks, which Shiny streams to the client; a
+            # returned string would be taken as the path of a file to send.
+            # The file is removed once the generator finishes
+            with open(csv_path, 'rb') as csv_file:
+                while chunk := csv_file.read(65536):
+                    yield chunk
     
     # FAQ Analysis Functions
     def analyze_platform_quality():
-        leads_df, _, _ = load_data()
-        platform_stats = (leads_df
-                         .group_by('platform')
-                         .agg([
-                             pl.col('lead_score').mean().alias('avg_lead_score'),
-                             (pl.col('status').eq('Converted').sum() / pl.len() * 100).alias('conversion_rate'),
-                             pl.len().alias('total_leads'),
-                             pl.col('opportunity_value').filter(pl.col('status') == 'Converted').mean().alias('avg_deal_size')
-                         ])
-                         .sort('avg_lead_score', descending=True))
-        
-        top_platform = platform_stats.row(0)
-        return f"Based on your data, **{top_platform[0]}** generates the highest quality leads with an average lead score of {top_platform[1]:.1f} and a conversion rate of {top_platform[2]:.1f}%. This platform has generated {top_platform[3]} total leads with an average deal size of ${top_platform[4]:,.0f} for converted leads."
+        top_platform = platform_stats().row(0, named=True)
+        return f"Based on your data, **{top_platform['platform']}** generates the highest quality leads with an average lead score of {top_platform['avg_score']:.1f} and a conversion rate of {top_platform['conversion_rate']:.1f}%. This platform has generated {top_platform['total_leads']} total leads with an average deal size of ${top_platform['avg_deal_size']:,.0f} for converted leads."
     
     def analyze_conversion_by_industry():
-        leads_df, _, _ = load_data()
-        industry_stats = (leads_df
-                         .group_by('industry')
-                         .agg([
-                             (pl.col('status').eq('Converted').sum() / pl.len() * 100).alias('conversion_rate'),
-                             pl.len().alias('lead_count')
-                         ])
-                         .filter(pl.col('lead_count') >= 3)
-                         .sort('conversion_rate', descending=True))
-        
-        top_industries = industry_stats.head(3)
-        result = "**Top converting industries:**\n\n"
-        for i, row in enumerate(top_industries.iter_rows()):
-            result += f"{i+1}. **{row[0]}**: {row[1]:.1f}% conversion rate ({row[2]} leads)\n"
-        
-        avg_conversion = leads_df.filter(pl.col('status') == 'Converted').height / leads_df.height * 100
-        result += f"\nOverall average conversion rate: {avg_conversion:.1f}%"
-        return result
+        # Read from the cached industry and overview aggregates
+        industry_stats = industry_conversion().filter(pl.col('total_leads') >= 3).head(3)
+        avg_conversion = leads_overview()['conversion_rate']
+        
+        # The answer is built as a list of lines and joined once
+        return "\n".join([
+            "**Top converting industries:**",
+            "",
+            *[f"{i+1}. **{industry}**: {rate:.1f}% conversion rate ({count} leads)"
+              for i, (industry, rate, count) in enumerate(zip_columns(industry_stats, 'industry', 'conversion_rate', 'total_leads'))],
+            "",
+            f"Overall average conversion rate: {avg_conversion:.1f}%"
+        ])
     
     def analyze_company_size_revenue():
-        leads_df, _, _ = load_data()
-        converted_leads = leads_df.filter(pl.col('status') == 'Converted')
-        size_stats = (converted_leads
-                     .group_by('company_size')
-                     .agg([
-                         pl.col('opportunity_value').sum().alias('total_revenue'),
-                         pl.col('opportunity_value').mean().alias('avg_deal_size'),
-                         pl.len().alias('converted_count')
-                     ])
-                     .sort('total_revenue', descending=True))
-        
-        top_segment = size_stats.row(0)
-        result = f"**{top_segment[0]}** companies have the highest revenue potential with ${top_segment[1]:,.0f} in total revenue from {top_segment[3]} converted leads.\n\n"
-        result += f"Average deal size for this segment: ${top_segment[2]:,.0f}\n\n"
-        result += "**Revenue breakdown by company size:**\n"
-        for row in size_stats.iter_rows():
-            result += f"• {row[0]}: ${row[1]:,.0f} total (${row[2]:,.0f} avg deal)\n"
-        return result
+        size_stats = size_revenue().sort('total_revenue', descending=True)
+        
+        top_segment = size_stats.row(0, named=True)
+        return "\n".join([
+            f"**{top_segment['company_size']}** companies have the highest revenue potential with ${top_segment['total_revenue']:,.0f} in total revenue from {top_segment['deals']} converted leads.",
+            "",
+            f"Average deal size for this segment: ${top_segment['avg_deal']:,.0f}",
+            "",
+            "**Revenue breakdown by company size:**",
+            *[f"• {size}: ${revenue:,.0f} total (${avg_deal:,.0f} avg deal)"
+              for size, revenue, avg_deal in zip_columns(size_stats, 'company_size', 'total_revenue', 'avg_deal')],
+            ""
+        ])
     
     def analyze_lead_score_correlation():
         leads_df, _, _ = load_data()
-        converted = leads_df.filter(pl.col('status') == 'Converted')
-        non_converted = leads_df.filter(pl.col('status') != 'Converted')
-        
-        converted_avg_score = converted['lead_score'].mean()
-        non_converted_avg_score = non_converted['lead_score'].mean()
-        
-        high_score_conversion = leads_df.filter(pl.col('lead_score') >= 80).filter(pl.col('status') == 'Converted').height
-        high_score_total = leads_df.filter(pl.col('lead_score') >= 80).height
+        # One pass over the leads for the score averages and high-score counts
+        high_score = pl.col('lead_score') >= 80
+        scores = leads_df.select([
+            pl.col('lead_score').filter(pl.col('is_converted')).mean().alias('converted_avg'),
+            pl.col('lead_score').filter(~pl.col('is_converted')).mean().alias('non_converted_avg'),
+            (high_score & pl.col('is_converted')).sum().alias('high_score_conversion'),
+            high_score.sum().alias('high_score_total'),
+        ]).row(0, named=True)
+        
+        converted_avg_score = scores['converted_avg']
+        non_converted_avg_score = scores['non_converted_avg']
+        high_score_conversion = scores['high_score_conversion']
+        high_score_total = scores['high_score_total']
         high_score_rate = (high_score_conversion / high_score_total * 100) if high_score_total > 0 else 0
         
-        result = f"**Lead Score Analysis:**\n\n"
-        result += f"• Average lead score for converted leads: **{converted_avg_score:.1f}**\n"
-        result += f"• Average lead score for non-converted leads: **{non_converted_avg_score:.1f}**\n"
-        result += f"• Difference: **{converted_avg_score - non_converted_avg_score:.1f} points**\n\n"
-        result += f"High-quality leads (score ≥80) convert at **{high_score_rate:.1f}%** ({high_score_conversion}/{high_score_total} leads)\n\n"
-        result += "This shows that lead scores are a strong predictor of conversion success."
-        return result
+        return "\n".join([
+            "**Lead Score Analysis:**",
+            "",
+            f"• Average lead score for converted leads: **{converted_avg_score:.1f}**",
+            f"• Average lead score for non-converted leads: **{non_converted_avg_score:.1f}**",
+            f"• Difference: **{converted_avg_score - non_converted_avg_score:.1f} points**",
+            "",
+            f"High-quality leads (score ≥80) convert at **{high_score_rate:.1f}%** ({high_score_conversion}/{high_score_total} leads)",
+            "",
+            "This shows that lead scores are a strong predictor of conversion success."
+        ])
     
     def analyze_seasonal_trends():
-        leads_df, _, _ = load_data()
-        monthly_trends = (leads_df
-                         .with_columns(pl.col('created_date').dt.strftime('%Y-%m').alias('month'))
-                         .group_by('month')
-                         .agg([
-                             pl.len().alias('lead_count'),
-                             (pl.col('status').eq('Converted').sum() / pl.len() * 100).alias('conversion_rate')
-                         ])
-                         .sort('month'))
-        
-        best_month = monthly_trends.sort('lead_count', descending=True).row(0)
-        best_conversion_month = monthly_trends.sort('conversion_rate', descending=True).row(0)
-        
-        result = f"**Seasonal Lead Generation Trends:**\n\n"
-        result += f"• **Highest volume month**: {best_month[0]} with {best_month[1]} leads\n"
-        result += f"• **Best conversion month**: {best_conversion_month[0]} with {best_conversion_month[2]:.1f}% conversion rate\n\n"
-        result += "**Monthly breakdown:**\n"
-        for row in monthly_trends.iter_rows():
-            result += f"• {row[0]}: {row[1]} leads ({row[2]:.1f}% conversion)\n"
-        return result
+        monthly_trends = monthly_leads()
+        
+        best_month = monthly_trends.row(monthly_trends['leads'].arg_max())
+        best_conversion_month = monthly_trends.row(monthly_trends['conversion_rate'].arg_max())
+        
+        return "\n".join([
+            "**Seasonal Lead Generation Trends:**",
+            "",
+            f"• **Highest volume month**: {best_month[0]} with {best_month[1]} leads",
+            f"• **Best conversion month**: {best_conversion_month[0]} with {best_conversion_month[2]:.1f}% conversion rate",
+            "",
+            "**Monthly breakdown:**",
+            *[f"• {month}: {count} leads ({rate:.1f}% conversion)"
+              for month, count, rate in zip_columns(monthly_trends, 'month', 'leads', 'conversion_rate')],
+            ""
+        ])
     
     def analyze_conversion_times():
-        leads_df, _, _ = load_data()
-        converted_leads = leads_df.filter(pl.col('status') == 'Converted')
-        
-        # Handle null values in industry column
-        converted_with_industry = converted_leads.with_columns(
-            pl.col('industry').fill_null('Unknown Industry')
-        )
+        # Days to conversion of the converted leads, computed once for both
+        # the per-industry and the overall average
+        conversion_times = converted_leads().select([
+            'industry',
+            (pl.col('conversion_date') - pl.col('created_date')).dt.total_days().alias('conversion_days')
+        ])
         
         # Calculate conversion times by industry
-        industry_times = (converted_with_industry
-                         .with_columns((pl.col('conversion_date') - pl.col('created_date')).dt.total_days().alias('conversion_days'))
+        industry_times = (conversion_times.lazy()
                          .group_by('industry')
                          .agg([
                              pl.col('conversion_days').mean().alias('avg_conversion_days'),
                              pl.len().alias('converted_count')
                          ])
                          .filter(pl.col('converted_count') >= 2)
-                         .sort('avg_conversion_days'))
-        
-        result = "**Industries with fastest conversion times:**\n\n"
-        for i, row in enumerate(industry_times.head(5).iter_rows()):
-            result += f"{i+1}. **{row[0]}**: {row[1]:.0f} days ({row[2]} conversions)\n"
-        
-        overall_avg = converted_with_industry.with_columns(
-            (pl.col('conversion_date') - pl.col('created_date')).dt.total_days().alias('conversion_days')
-        )['conversion_days'].mean()
-        result += f"\nOverall average conversion time: {overall_avg:.0f} days"
-        return result
+                         .sort('avg_conversion_days')
+                         .head(5)
+                         .collect())
+        
+        overall_avg = conversion_times['conversion_days'].mean()
+        
+        return "\n".join([
+            "**Industries with fastest conversion times:**",
+            "",
+            *[f"{i+1}. **{industry}**: {days:.0f} days ({count} conversions)"
+              for i, (industry, days, count) in enumerate(zip_columns(industry_times, 'industry', 'avg_conversion_days', 'converted_count'))],
+            "",
+            f"Overall average conversion time: {overall_avg:.0f} days"
+        ])
     
     def analyze_platform_roi():
-        leads_df, platform_df, _ = load_data()
+        _, platform_df, _ = load_data()
         
-        # Calculate total revenue by platform
-        revenue_by_platform = (leads_df
-                              .filter(pl.col('status') == 'Converted')
-                              .group_by('platform')
-                              .agg([
-                                  pl.col('opportunity_value').sum().alias('total_revenue'),
-                                  pl.len().alias('conversions')
-                              ]))
+        # Total revenue by platform, from the shared platform aggregate; only
+        # platforms with conversions are compared
+        revenue_by_platform = (platform_stats().lazy()
+                              .filter(pl.col('conversions') > 0)
+                              .select(['platform', 'total_revenue', 'conversions']))
         
         # Get total spend by platform from platform_df
-        spend_by_platform = (platform_df
+        spend_by_platform = (platform_df.lazy()
                             .group_by('platform')
                             .agg(pl.col('total_spend').sum().alias('total_spend')))
         
@@ -881,85 +1371,101 @@ def server(input, output, session):
         roi_analysis = (revenue_by_platform
                        .join(spend_by_platform, on='platform', how='inner')
                        .with_columns((pl.col('total_revenue') / pl.col('total_spend')).alias('roi'))
-                       .sort('roi', descending=True))
-        
-        result = "**Platform ROI Analysis:**\n\n"
-        for row in roi_analysis.iter_rows():
-            result += f"• **{row[0]}**: ${row[1]:,.0f} revenue / ${row[3]:,.0f} spend = **{row[4]:.1f}x ROI** ({row[2]} conversions)\n"
-        
-        return result
+                       .sort('roi', descending=True)
+                       .collect())
+        
+        return "\n".join([
+            "**Platform ROI Analysis:**",
+            "",
+            *[f"• **{platform}**: ${revenue:,.0f} revenue / ${spend:,.0f} spend = **{roi:.1f}x ROI** ({conversions} conversions)"
+              for platform, revenue, spend, roi, conversions in zip_columns(
+                  roi_analysis, 'platform', 'total_revenue', 'total_spend', 'roi', 'conversions')],
+            ""
+        ])
     
     def analyze_best_converting_leads():
-        leads_df, _, _ = load_data()
-        converted_leads = leads_df.filter(pl.col('status') == 'Converted')
-        
-        # Analyze characteristics of converted leads
-        platform_conversion = (converted_leads
-                              .group_by('platform')
-                              .agg(pl.len().alias('count'))
-                              .sort('count', descending=True))
-        
-        size_conversion = (converted_leads
-                          .group_by('company_size')
-                          .agg(pl.len().alias('count'))
-                          .sort('count', descending=True))
-        
-        avg_score = converted_leads['lead_score'].mean()
-        avg_revenue = converted_leads['annual_revenue'].mean()
-        avg_employees = converted_leads['employees'].mean()
-        
-        result = "**Characteristics of Best Converting Leads:**\n\n"
-        result += f"**Average Profile:**\n"
-        result += f"• Lead Score: {avg_score:.1f}\n"
-        result += f"• Company Revenue: ${avg_revenue:,.0f}\n"
-        result += f"• Company Size: {avg_employees:.0f} employees\n\n"
-        
-        result += f"**Top Converting Platforms:**\n"
-        for row in platform_conversion.head(3).iter_rows():
-            result += f"• {row[0]}: {row[1]} conversions\n"
-        
-        result += f"\n**Top Converting Company Sizes:**\n"
-        for row in size_conversion.iter_rows():
-            result += f"• {row[0]}: {row[1]} conversions\n"
-        
-        return result
+        converted = converted_leads().lazy()
+        
+        # Analyze characteristics of converted leads. The profile averages
+        # are one select, run with both counts by one collect_all
+        profile, platform_conversion, size_conversion = pl.collect_all([
+            converted.select([
+                pl.col('lead_score').mean().alias('avg_score'),
+                pl.col('annual_revenue').mean().alias('avg_revenue'),
+                pl.col('employees').mean().alias('avg_employees')
+            ]),
+            converted
+            .group_by('platform')
+            .agg(pl.len().alias('count'))
+            .sort('count', descending=True)
+            .head(3),
+            converted
+            .group_by('company_size')
+            .agg(pl.len().alias('count'))
+            .sort('count', descending=True)
+        ])
+        avg_score, avg_revenue, avg_employees = profile.row(0)
+        
+        return "\n".join([
+            "**Characteristics of Best Converting Leads:**",
+            "",
+            "**Average Profile:**",
+            f"• Lead Score: {avg_score:.1f}",
+            f"• Company Revenue: ${avg_revenue:,.0f}",
+            f"• Company Size: {avg_employees:.0f} employees",
+            "",
+            "**Top Converting Platforms:**",
+            *[f"• {platform}: {count} conversions" for platform, count in zip_columns(platform_conversion, 'platform', 'count')],
+            "",
+            "**Top Converting Company Sizes:**",
+            *[f"• {size}: {count} conversions" for size, count in zip_columns(size_conversion, 'company_size', 'count')],
+            ""
+        ])
     
     def analyze_lead_activity_patterns():
-        leads_df, _, _ = load_data()
-        
-        # Analyze by month
-        monthly_activity = (leads_df
-                           .with_columns(pl.col('created_date').dt.strftime('%Y-%m').alias('month'))
-                           .group_by('month')
-                           .agg(pl.len().alias('lead_count'))
-                           .sort('month'))
-        
-        # Analyze by day of week
-        weekly_activity = (leads_df
-                          .with_columns(pl.col('created_date').dt.weekday().alias('weekday'))
-                          .group_by('weekday')
-                          .agg(pl.len().alias('lead_count'))
-                          .sort('weekday'))
-        
-        weekday_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        
-        best_month = monthly_activity.sort('lead_count', descending=True).row(0)
-        best_weekday = weekly_activity.sort('lead_count', descending=True).row(0)
-        
-        result = "**Lead Activity Patterns:**\n\n"
-        result += f"**Peak Activity:**\n"
-        result += f"• Best month: {best_month[0]} with {best_month[1]} leads\n"
-        result += f"• Best day: {weekday_names[best_weekday[0]-1]} with {best_weekday[1]} leads\n\n"
-        
-        result += f"**Monthly Activity:**\n"
-        for row in monthly_activity.iter_rows():
-            result += f"• {row[0]}: {row[1]} leads\n"
-        
-        result += f"\n**Weekly Pattern:**\n"
-        for row in weekly_activity.iter_rows():
-            result += f"• {weekday_names[row[0]-1]}: {row[1]} leads\n"
-        
-        return result
+        # Lead counts by month and by day of week, from the cached aggregates
+        monthly_activity = monthly_leads()
+        weekly_activity = weekday_leads()
+        
+        best_month = monthly_activity.row(monthly_activity['leads'].arg_max())
+        best_weekday = weekly_activity.row(weekly_activity['leads'].arg_max())
+        
+        return "\n".join([
+            "**Lead Activity Patterns:**",
+            "",
+            "**Peak Activity:**",
+            f"• Best month: {best_month[0]} with {best_month[1]} leads",
+            f"• Best day: {best_weekday[0]} with {best_weekday[1]} leads",
+            "",
+            "**Monthly Activity:**",
+            *[f"• {month}: {count} leads" for month, count in zip_columns(monthly_activity, 'month', 'leads')],
+            "",
+            "**Weekly Pattern:**",
+            *[f"• {day}: {count} leads" for day, count in zip_columns(weekly_activity, 'day', 'leads')],
+            ""
+        ])
+    
+    def analyze_question(question):
+        if question == "Which platform generates the highest quality leads?":
+            return analyze_platform_quality()
+        elif question == "What is the average conversion rate by industry?":
+            return analyze_conversion_by_industry()
+        elif question == "Which company size segment has the highest revenue potential?":
+            return analyze_company_size_revenue()
+        elif question == "How do lead scores correlate with actual conversions?":
+            return analyze_lead_score_correlation()
+        elif question == "What are the seasonal trends in lead generation?":
+            return analyze_seasonal_trends()
+        elif question == "Which industries have the fastest conversion times?":
+            return analyze_conversion_times()
+        elif question == "What is the ROI comparison across different platforms?":
+            return analyze_platform_roi()
+        elif question == "What are the characteristics of our best converting leads?":
+            return analyze_best_converting_leads()
+        elif question == "Which time periods show the highest lead activity?":
+            return analyze_lead_activity_patterns()
+        else:
+            return "This analysis is not yet implemented. Please select a different question."
     
     # FAQ Answer Handler
     @output
@@ -971,26 +1477,11 @@ def server(input, output, session):
             return ui.div("Please select a question to see the analysis.")
         
         try:
-            if question == "Which platform generates the highest quality leads?":
-                answer = analyze_platform_quality()
-            elif question == "What is the average conversion rate by industry?":
-                answer = analyze_conversion_by_industry()
-            elif question == "Which company size segment has the highest revenue potential?":
-                answer = analyze_company_size_revenue()
-            elif question == "How do lead scores correlate with actual conversions?":
-                answer = analyze_lead_score_correlation()
-            elif question == "What are the seasonal trends in lead generation?":
-                answer = analyze_seasonal_trends()
-            elif question == "Which industries have the fastest conversion times?":
-                answer = analyze_conversion_times()
-            elif question == "What is the ROI comparison across different platforms?":
-                answer = analyze_platform_roi()
-            elif question == "What are the characteristics of our best converting leads?":
-                answer = analyze_best_converting_leads()
-            elif question == "Which time periods show the highest lead activity?":
-                answer = analyze_lead_activity_patterns()
-            else:
-                answer = "This analysis is not yet implemented. Please select a different question."
+            # Shared by all sessions, see faq_answers
+            answer = faq_answers.get(question)
+            if answer is None:
+                answer = analyze_question(question)
+                faq_answers[question] = answer
             
             return ui.div(
                 ui.h4(question, style="color: #2c3e50; margin-bottom: 15px;"),
@@ -1005,181 +1496,16 @@ def server(input, output, session):
             )
     
     # QueryChat functionality
-    def process_natural_language_query(question):
+    def process_natural_language_query(question_lower):
         """Process natural language questions and return data-driven answers"""
-        leads_df, platform_df, quality_df = load_data()
-        question_lower = question.lower()
+        keywords = query_keywords(question_lower)
         
         try:
-            # Check for platform-specific industry queries first
-            if ('industry' in question_lower or 'industries' in question_lower) and any(platform in question_lower for platform in ['tiktok', 'linkedin', 'events']):
-                if 'convert' in question_lower or 'conversion' in question_lower:
-                    # Check if question is asking about a specific platform
-                    platform_filter = None
-                    if 'tiktok' in question_lower:
-                        platform_filter = 'TikTok'
-                    elif 'linkedin' in question_lower:
-                        platform_filter = 'LinkedIn'
-                    elif 'events' in question_lower:
-                        platform_filter = 'Events'
-                    
-                    # Filter by platform if specified
-                    filtered_leads = leads_df.filter(pl.col('platform') == platform_filter) if platform_filter else leads_df
-                    
-                    if filtered_leads.height == 0:
-                        return f"No leads found for {platform_filter}."
-                    
-                    # Handle null values in industry column
-                    filtered_leads = filtered_leads.with_columns(
-                        pl.col('industry').fill_null('Unknown Industry')
-                    )
-                    
-                    industry_conversion = filtered_leads.group_by('industry').agg([
-                        (pl.col('status').eq('Converted').sum() / pl.len() * 100).alias('conversion_rate'),
-                        pl.len().alias('total_leads')
-                    ]).filter(pl.col('total_leads') >= 1).sort('conversion_rate', descending=True)
-                    
-                    result = f"**Industry conversion rates for {platform_filter}:**\n\n"
-                    
-                    if industry_conversion.height == 0:
-                        return f"No industries found for {platform_filter}."
-                    
-                    for row in industry_conversion.iter_rows():
-                        result += f"• {row[0]}: {row[1]:.1f}% ({row[2]} leads)\n"
-                    return result
-            
-            # Platform-related queries
-            elif any(word in question_lower for word in ['platform', 'linkedin', 'tiktok', 'events']):
-                if 'count' in question_lower or 'how many' in question_lower:
-                    platform_counts = leads_df.group_by('platform').agg(pl.len().alias('count')).sort('count', descending=True)
-                    result = "**Lead counts by platform:**\n\n"
-                    for row in platform_counts.iter_rows():
-                        result += f"• {row[0]}: {row[1]} leads\n"
-                    return result
-                
-                elif 'quality' in question_lower or 'score' in question_lower:
-                    platform_quality = leads_df.group_by('platform').agg([
-                        pl.col('lead_score').mean().alias('avg_score'),
-                        (pl.col('status').eq('Converted').sum() / pl.len() * 100).alias('conversion_rate')
-                    ]).sort('avg_score', descending=True)
-                    result = "**Platform quality comparison:**\n\n"
-                    for row in platform_quality.iter_rows():
-                        result += f"• {row[0]}: {row[1]:.1f} avg score, {row[2]:.1f}% conversion\n"
-                    return result
-            
-            # Industry-related queries (general)
-            elif 'industry' in question_lower or 'industries' in question_lower:
-                if 'convert' in question_lower or 'conversion' in question_lower:
-                    # Handle null values in industry column
-                    leads_with_industry = leads_df.with_columns(
-                        pl.col('industry').fill_null('Unknown Industry')
-                    )
-                    
-                    industry_conversion = leads_with_industry.group_by('industry').agg([
-                        (pl.col('status').eq('Converted').sum() / pl.len() * 100).alias('conversion_rate'),
-                        pl.len().alias('total_leads')
-                    ]).filter(pl.col('total_leads') >= 2).sort('conversion_rate', descending=True)
-                    
-                    result = "**Industry conversion rates:**\n\n"
-                    
-                    if industry_conversion.height == 0:
-                        return "No industries with sufficient data found."
-                    
-                    for row in industry_conversion.iter_rows():
-                        result += f"• {row[0]}: {row[1]:.1f}% ({row[2]} leads)\n"
-                    return result
-            
-            # Company size queries
-            elif any(word in question_lower for word in ['company size', 'enterprise', 'small', 'medium', 'large']):
-                if 'deal size' in question_lower or 'revenue' in question_lower:
-                    size_revenue = leads_df.filter(pl.col('status') == 'Converted').group_by('company_size').agg([
-                        pl.col('opportunity_value').mean().alias('avg_deal'),
-                        pl.col('opportunity_value').sum().alias('total_revenue'),
-                        pl.len().alias('deals')
-                    ]).sort('avg_deal', descending=True)
-                    result = "**Revenue by company size:**\n\n"
-                    for row in size_revenue.iter_rows():
-                        result += f"• {row[0]}: ${row[1]:,.0f} avg deal, ${row[2]:,.0f} total ({row[3]} deals)\n"
-                    return result
-            
-            # Monthly/seasonal queries
-            elif any(word in question_lower for word in ['month', 'monthly', 'seasonal', 'trend']):
-                monthly_data = leads_df.with_columns(
-                    pl.col('created_date').dt.strftime('%Y-%m').alias('month')
-                ).group_by('month').agg([
-                    pl.len().alias('leads'),
-                    (pl.col('status').eq('Converted').sum() / pl.len() * 100).alias('conversion_rate')
-                ]).sort('month')
-                
-                if 'conversion' in question_lower:
-                    best_month = monthly_data.sort('conversion_rate', descending=True).row(0)
-                    result = f"**Monthly conversion rates:**\n\n"
-                    result += f"Best month: {best_month[0]} with {best_month[2]:.1f}% conversion\n\n"
-                    for row in monthly_data.iter_rows():
-                        result += f"• {row[0]}: {row[2]:.1f}% conversion ({row[1]} leads)\n"
-                else:
-                    result = "**Monthly lead generation:**\n\n"
-                    for row in monthly_data.iter_rows():
-                        result += f"• {row[0]}: {row[1]} leads ({row[2]:.1f}% conversion)\n"
-                return result
+            for keyword_groups, answer in QUERY_ROUTES:
+                if all(keywords & group for group in keyword_groups):
+                    return answer(question_lower, keywords)
             
-            # High score leads
-            elif 'score above' in question_lower or 'high score' in question_lower:
-                import re
-                score_match = re.search(r'(\d+)', question_lower)
-                threshold = int(score_match.group(1)) if score_match else 80
-                
-                high_score_leads = leads_df.filter(pl.col('lead_score') >= threshold)
-                result = f"**Leads with scores ≥ {threshold}:**\n\n"
-                result += f"Total: {high_score_leads.height} leads\n"
-                
-                platform_breakdown = high_score_leads.group_by('platform').agg(pl.len().alias('count')).sort('count', descending=True)
-                result += "\n**By platform:**\n"
-                for row in platform_breakdown.iter_rows():
-                    result += f"• {row[0]}: {row[1]} leads\n"
-                
-                conversion_rate = (high_score_leads.filter(pl.col('status') == 'Converted').height / high_score_leads.height * 100) if high_score_leads.height > 0 else 0
-                result += f"\n**Conversion rate**: {conversion_rate:.1f}%"
-                return result
-            
-            # Lead quality comparison
-            elif 'compare' in question_lower and 'quality' in question_lower:
-                quality_comparison = leads_df.group_by('platform').agg([
-                    pl.col('lead_score').mean().alias('avg_score'),
-                    pl.col('lead_score').median().alias('median_score'),
-                    (pl.col('status').eq('Converted').sum() / pl.len() * 100).alias('conversion_rate'),
-                    pl.len().alias('total_leads')
-                ]).sort('avg_score', descending=True)
-                
-                result = "**Lead Quality Comparison by Platform:**\n\n"
-                for row in quality_comparison.iter_rows():
-                    result += f"**{row[0]}:**\n"
-                    result += f"  • Average Score: {row[1]:.1f}\n"
-                    result += f"  • Median Score: {row[2]:.1f}\n"
-                    result += f"  • Conversion Rate: {row[3]:.1f}%\n"
-                    result += f"  • Total Leads: {row[4]}\n\n"
-                return result
-            
-            # General data overview
-            elif any(word in question_lower for word in ['overview', 'summary', 'total']):
-                total_leads = leads_df.height
-                converted_leads = leads_df.filter(pl.col('status') == 'Converted').height
-                conversion_rate = (converted_leads / total_leads * 100) if total_leads > 0 else 0
-                total_revenue = leads_df.filter(pl.col('status') == 'Converted')['opportunity_value'].sum()
-                avg_deal_size = leads_df.filter(pl.col('status') == 'Converted')['opportunity_value'].mean()
-                avg_lead_score = leads_df['lead_score'].mean()
-                
-                result = "**Data Overview:**\n\n"
-                result += f"• **Total Leads**: {total_leads}\n"
-                result += f"• **Converted Leads**: {converted_leads}\n"
-                result += f"• **Overall Conversion Rate**: {conversion_rate:.1f}%\n"
-                result += f"• **Total Revenue**: ${total_revenue:,.0f}\n"
-                result += f"• **Average Deal Size**: ${avg_deal_size:,.0f}\n"
-                result += f"• **Average Lead Score**: {avg_lead_score:.1f}\n"
-                return result
-            
-            else:
-                return "I couldn't understand your question. Please try rephrasing it or use one of the example questions below. I can help you analyze platforms, industries, company sizes, lead scores, conversion rates, and revenue data."
+            return "I couldn't understand your question. Please try rephrasing it or use one of the example questions below. I can help you analyze platforms, industries, company sizes, lead scores, conversion rates, and revenue data."
                 
         except Exception as e:
             return f"Sorry, I encountered an error processing your question: {str(e)}. Please try a different question."
@@ -1192,24 +1518,24 @@ def server(input, output, session):
         if input.submit_query() == 0:
             return ui.div()
         
+        # The question is stripped and lowercased once here; the router and
+        # the answer handlers all work on this form
         question = input.query_question()
-        if not question or question.strip() == "":
-            return ui.div(
-                ui.h4("Please enter a question", style="color: #e74c3c;"),
-                class_="chat-response"
-            )
+        question_lower = question.strip().lower() if question else ""
+        if not question_lower:
+            return EMPTY_QUERY_RESPONSE
         
         try:
-            answer = process_natural_language_query(question)
+            answer = process_natural_language_query(question_lower)
             return ui.div(
-                ui.h4(f"Q: {question}", style="color: #2c3e50; margin-bottom: 15px;"),
+                ui.h4(f"Q: {question}", style=QUERY_QUESTION_STYLE),
                 ui.markdown(answer),
                 class_="chat-response"
             )
         except Exception as e:
             return ui.div(
-                ui.h4(f"Q: {question}", style="color: #2c3e50; margin-bottom: 15px;"),
-                ui.p(f"Sorry, I encountered an error: {str(e)}", style="color: #e74c3c;"),
+                ui.h4(f"Q: {question}", style=QUERY_QUESTION_STYLE),
+                ui.p(f"Sorry, I encountered an error: {str(e)}", style=QUERY_ERROR_STYLE),
                 class_="chat-response"
             )
 
@@ -0,0 +1,259 @@
+"""Data and cached queries behind the Shiny Express dashboard (app-express.py).
+
+Shiny Express runs the app file again for every session, so anything defined
+there is rebuilt per session. This module is imported instead, which Python
+does once per process: the data is loaded, and the filter and aggregate
+caches are shared, by all sessions.
+"""
+
+import functools
+
+import chatlas
+import polars as pl
+import querychat as qc
+
+from prepare_data import COMPANY_SIZES, LEAD_STATUSES, PLATFORMS, scan_sources
+
+
+def month_label(key_col: pl.Expr) -> pl.Expr:
+    # Display form "YYYY-MM" of a month_key, built only for grouped rows
+    return pl.format(
+        "{}-{}", key_col // 100, (key_col % 100).cast(pl.Utf8).str.zfill(2)
+    )
+
+
+def use_github_models(system_prompt: str) -> chatlas.Chat:
+    return chatlas.ChatGithub(
+        model="gpt-4.1",
+        system_prompt=system_prompt,
+    )
+
+def use_anthropic_models(system_prompt: str) -> chatlas.Chat:
+    return chatlas.ChatAnthropic(
+        model="claude-3-7-sonnet-latest",
+        system_prompt=system_prompt,
+    )
+
+
+def load_data():
+    # Read the typed Parquet copies of the CSVs, rebuilding any that are stale
+    # The dashboard only reads the leads, so the platform and quality sources
+    # are left unread
+    leads_lf, _, _ = scan_sources()
+
+    # scan_leads stores the leads in created_date order; flag the column as
+    # sorted so the date filter can slice it without sorting again
+    leads_lf = leads_lf.set_sorted("created_date")
+
+    # Materialize the leads once; the app's reactive calcs build lazy queries
+    # on top of this frame and collect them at the end.
+    leads_df = leads_lf.collect()
+
+    # The industry enum holds the sorted industries, which also feed the
+    # industry selectize choices
+    industries = leads_df["industry"].dtype.categories.to_list()
+
+    return leads_df, industries
+
+
+def slice_dates(df, date_start, date_end):
+    # `df` is sorted by created_date, so the range is a contiguous slice found
+    # by binary search
+    created_dates = df["created_date"]
+    lo = created_dates.search_sorted(date_start, side="left")
+    hi = created_dates.search_sorted(date_end, side="right")
+    return df.slice(lo, max(hi - lo, 0))
+
+
+leads_df, industries = load_data()
+
+# With every option of a checkbox group ticked the filter is a no-op, so it
+# is skipped
+ALL_PLATFORMS = frozenset(PLATFORMS)
+ALL_COMPANY_SIZES = frozenset(COMPANY_SIZES)
+ALL_LEAD_STATUSES = frozenset(LEAD_STATUSES)
+
+# The dashboard filters and aggregates only read these columns, so the
+# filtered frames carry nothing else
+dashboard_leads = leads_df.select([
+    "created_date",
+    "month_key",
+    "platform",
+    "company_size",
+    "industry",
+    "status",
+    "is_converted",
+    "lead_score",
+    "opportunity_value",
+])
+
+# Date-sorted leads split by platform: the platform checkboxes pick slices
+# from here instead of filtering every row
+platform_partitions = {
+    platform: part
+    for (platform,), part in dashboard_leads.partition_by(
+        "platform", as_dict=True
+    ).items()
+}
+
+# The FAQ answers read the full, unfiltered data, so their shared inputs are
+# computed once here rather than on every render
+converted_leads = leads_df.filter(pl.col("is_converted"))
+score_p75 = converted_leads.select(pl.col("lead_score").quantile(0.75)).item()
+
+# Lead score histogram bins span the full data range, so they stay put as the
+# filters change
+score_bins = 20
+score_min = leads_df["lead_score"].min()
+score_max = leads_df["lead_score"].max()
+score_bin_width = (score_max - score_min) / score_bins
+
+# One querychat configuration (schema summary and system prompt) for the app,
+# set up with the data rather than inside the Querychat panel. The derived
+# is_converted and month_key columns are left out of the schema it describes
+querychat_config = qc.init(
+    leads_df.drop(["is_converted", "month_key"]),
+    "leads_df",
+    create_chat_callback=use_anthropic_models,
+)
+
+
+@functools.lru_cache(maxsize=64)
+def platform_date_leads(date_start, date_end, platforms):
+    # Date and platform filters: slice the selected platform partitions.
+    # Cached on its own so toggling another filter doesn't redo this step
+    if not platforms or frozenset(platforms) == ALL_PLATFORMS:
+        return slice_dates(dashboard_leads, date_start, date_end)
+
+    parts = [
+        slice_dates(platform_partitions[platform], date_start, date_end)
+        for platform in platforms
+        if platform in platform_partitions
+    ]
+
+    if not parts:
+        return dashboard_leads.clear()
+    return pl.concat(parts)
+
+
+@functools.lru_cache(maxsize=64)
+def filter_leads(date_start, date_end, platforms, company_sizes, industries, statuses):
+    # Keyed on the filter values (as sorted tuples), so going back to an
+    # earlier filter state reuses its result across reactive flushes
+    filtered_leads = platform_date_leads(date_start, date_end, platforms)
+
+    # Combine the active filters into one predicate so they run as a single
+    # pass over the platform/date slice
+    predicate = pl.lit(True)
+
+    # Company size filter
+    if company_sizes and frozenset(company_sizes) != ALL_COMPANY_SIZES:
+        predicate &= pl.col("company_size").is_in(company_sizes)
+
+    # Industry filter
+    if industries:
+        predicate &= pl.col("industry").is_in(industries)
+
+    # Status filter
+    if statuses and frozenset(statuses) != ALL_LEAD_STATUSES:
+        predicate &= pl.col("status").is_in(statuses)
+
+    return filtered_leads.lazy().filter(predicate).collect()
+
+
+@functools.lru_cache(maxsize=64)
+def aggregate_leads(key):
+    # Cached per filter key like filter_leads, so a repeated filter state
+    # skips the aggregation as well; callers only read the frames
+    filtered_leads = filter_leads(*key).lazy()
+    converted = pl.col("is_converted")
+    conversion_rate = (converted.mean() * 100).alias("conversion_rate")
+
+    # Group by month and platform
+    trend_plan = (
+        filtered_leads.group_by(["month_key", "platform"])
+        .agg(pl.len().alias("leads"))
+        .sort(["month_key", "platform"])
+        .select([
+            month_label(pl.col("month_key")).alias("month"),
+            "platform",
+            "leads",
+        ])
+    )
+
+    # Platform performance metrics
+    platform_plan = filtered_leads.group_by("platform").agg([
+        pl.col("lead_score").mean().alias("avg_lead_score"),
+        conversion_rate,
+    ])
+
+    # Conversion funnel by platform, reshaped to one row per stage
+    funnel_plan = (
+        filtered_leads.group_by("platform")
+        .agg([
+            pl.len().alias("Total Leads"),
+            pl.col("status")
+            .is_in(["Qualified", "Opportunity", "Converted"])
+            .sum()
+            .alias("Qualified"),
+            converted.sum().alias("Converted"),
+        ])
+        .unpivot(index="platform", variable_name="stage", value_name="count")
+    )
+
+    # Industry performance; industries with a single lead are dropped after
+    # the (one-pass) aggregation, which is cheaper than pre-filtering rows
+    industry_plan = (
+        filtered_leads.group_by("industry")
+        .agg([
+            pl.len().alias("lead_count"),
+            pl.col("lead_score").mean().alias("avg_lead_score"),
+            conversion_rate,
+        ])
+        .filter(pl.col("lead_count") >= 2)
+    )
+
+    # Revenue by platform and company size
+    revenue_plan = (
+        filtered_leads.filter(converted)
+        .group_by(["platform", "company_size"])
+        .agg(pl.col("opportunity_value").sum().alias("revenue"))
+    )
+
+    # Bin lead scores here so the chart only receives the bar heights
+    score_bin = (
+        ((pl.col("lead_score") - score_min) / score_bin_width)
+        .floor()
+        .clip(0, score_bins - 1)
+    )
+    score_hist_plan = (
+        filtered_leads.group_by(["platform", score_bin.alias("bin")])
+        .agg(pl.len().alias("count"))
+        .with_columns(
+            (score_min + (pl.col("bin") + 0.5) * score_bin_width).alias("lead_score")
+        )
+        .sort("lead_score")
+    )
+
+    # All four KPIs in a single pass over the filtered leads
+    kpi_plan = filtered_leads.select([
+        pl.len().alias("total_leads"),
+        converted.sum().alias("converted_leads"),
+        (converted.mean() * 100).alias("conversion_rate"),
+        pl.col("opportunity_value").filter(converted).mean().alias("avg_deal"),
+        pl.col("opportunity_value").filter(converted).sum().alias("total_revenue"),
+    ])
+
+    # The plans share the filtered input and are independent, so collect them
+    # together and let Polars run them in parallel
+    names = ["trend", "platform", "funnel", "industry", "revenue", "score_hist", "kpi"]
+    frames = pl.collect_all([
+        trend_plan,
+        platform_plan,
+        funnel_plan,
+        industry_plan,
+        revenue_plan,
+        score_hist_plan,
+        kpi_plan,
+    ])
+    return dict(zip(names, frames))
@@ -0,0 +1,145 @@
+"""Convert the dashboard's source CSV files into typed Parquet files.
+
+The apps call `scan_sources()` on start-up, which rebuilds any Parquet file
+that is missing or older than its CSV (or than this script). It can also be
+run ahead of a deploy:
+
+    python prepare_data.py
+"""
+
+import os
+import tempfile
+
+import polars as pl
+
+PLATFORMS = [
+    "LinkedIn",
+    "TikTok",
+    "Events",
+    "Google Ads",
+    "Facebook",
+    "YouTube",
+    "Webinars",
+    "Podcasts",
+]
+COMPANY_SIZES = [
+    "Small (< 50)",
+    "Medium (50-250)",
+    "Large (251-500)",
+    "Enterprise (500+)",
+]
+LEAD_STATUSES = ["Converted", "Qualified", "Opportunity", "Nurturing"]
+
+SOURCES = {
+    "salesforce_leads.csv": "salesforce_leads.parquet",
+    "platform_performance.csv": "platform_performance.parquet",
+    "lead_quality_metrics.csv": "lead_quality_metrics.parquet",
+}
+
+
+def scan_leads(csv_path: str) -> pl.LazyFrame:
+    # Store the dates as Date columns and the categories as enums (or a
+    # categorical for the open-ended lead_source), so readers skip string
+    # parsing and group on integer codes.
+    #
+    # Bounded numeric columns are narrowed; the strict casts fail the
+    # conversion if a value doesn't fit. opportunity_value and annual_revenue
+    # stay Int64: revenue is summed from the former, and a large company's
+    # annual revenue can exceed any narrower type.
+    #
+    # Industries aren't a fixed list, so their enum comes from the data. A
+    # missing industry is stored as "Unknown Industry", so readers never
+    # have to fill it in themselves.
+    industry = pl.col("industry").fill_null("Unknown Industry")
+    industries = (
+        pl.scan_csv(csv_path)
+        .select(industry.unique().sort())
+        .collect()
+    )
+
+    # The CSV reader decodes the ISO dates itself, no string column in between
+    leads_lf = pl.scan_csv(
+        csv_path,
+        schema_overrides={"created_date": pl.Date, "conversion_date": pl.Date},
+    ).with_columns([
+        pl.col("platform").cast(pl.Enum(PLATFORMS)),
+        pl.col("status").cast(pl.Enum(LEAD_STATUSES)),
+        industry.cast(pl.Enum(industries["industry"])),
+        pl.col("lead_source").cast(pl.Categorical),
+        pl.col("lead_score").cast(pl.UInt8),
+        pl.col("employees").cast(pl.UInt32),
+    ])
+
+    # Add company size categories, an integer year * 100 + month key for the
+    # monthly trends and a converted flag shared by every conversion metric.
+    # The sizes are one binned lookup over right-closed intervals (employee
+    # counts are integers, so <= 49 is < 50); a missing count falls in the
+    # last size, as it always has.
+    #
+    # Rows are stored in created_date order, so the Parquet row groups have
+    # tight date statistics and readers can slice a date range.
+    return leads_lf.sort("created_date").with_columns(
+        pl.col("status").eq("Converted").alias("is_converted"),
+        (pl.col("created_date").dt.year() * 100 + pl.col("created_date").dt.month())
+        .alias("month_key"),
+        pl.col("employees")
+        .cut([49, 250, 500], labels=COMPANY_SIZES)
+        .cast(pl.String)
+        .fill_null(COMPANY_SIZES[-1])
+        .cast(pl.Enum(COMPANY_SIZES))
+        .alias("company_size")
+    )
+
+
+def scan_source(csv_path: str) -> pl.LazyFrame:
+    if csv_path == "salesforce_leads.csv":
+        return scan_leads(csv_path)
+    return pl.scan_csv(csv_path)
+
+
+def is_stale(csv_path: str, parquet_path: str) -> bool:
+    # A change to the conversion code here also invalidates existing files
+    if not os.path.exists(parquet_path):
+        return True
+    built = os.path.getmtime(parquet_path)
+    return built < os.path.getmtime(csv_path) or built < os.path.getmtime(__file__)
+
+
+def write_parquet(csv_path: str, parquet_path: str) -> None:
+    # Written to a temporary file next to the target and renamed into place,
+    # so an interrupted write never leaves a truncated file that looks fresh,
+    # and concurrent rebuilds each replace the file whole
+    fd, tmp_path = tempfile.mkstemp(
+        suffix=".tmp.parquet", dir=os.path.dirname(os.path.abspath(parquet_path))
+    )
+    os.close(fd)
+    try:
+        scan_source(csv_path).sink_parquet(tmp_path, compression="zstd")
+        # mkstemp creates the file readable by its owner only
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, parquet_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def ensure_parquet() -> None:
+    for csv_path, parquet_path in SOURCES.items():
+        if is_stale(csv_path, parquet_path):
+            write_parquet(csv_path, parquet_path)
+
+
+def scan_sources() -> list[pl.LazyFrame]:
+    # Lazy scans of the sources in SOURCES order: the Parquet copies when they
+    # can be kept up to date, otherwise the same typed plan over the CSVs
+    # (e.g. on a read-only deploy)
+    try:
+        ensure_parquet()
+    except OSError:
+        return [scan_source(csv_path) for csv_path in SOURCES]
+
+    return [pl.scan_parquet(parquet_path) for parquet_path in SOURCES.values()]
+
+
+if __name__ == "__main__":
+    ensure_parquet()